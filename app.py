@@ -1,30 +1,105 @@
+import argparse
+import logging
+import os
+import sys
+import threading
+from typing import AsyncIterator, Iterator, TextIO
+
+from models.ollama import Ollama
 from presentation.ui import UI
 from schemas.trip_details import TripDetails
+from services.async_travel_planner import AsyncTravelPlanner
+from services.batch_planner import run_batch
+from services.metrics import start_metrics_server
 from services.traveler_planner import TravelPlanner
+from tools.city_index import city_index
+
+logger = logging.getLogger(__name__)
 
 
 class App:
     def __init__(self):
-        self.ui = UI(self.plan_trip)
+        self.ui = UI(self.aplan_trip)
+
+    @staticmethod
+    def _build_trip_details(destination: str, travel_from: str, travel_to: str,
+                            experience: str, spend_level: str, model: str) -> TripDetails:
+        return TripDetails(
+            destination=destination,
+            travel_from=travel_from,
+            travel_to=travel_to,
+            travel_experience=experience,
+            spend_level=spend_level,
+            model=model
+        )
 
     def plan_trip(self, destination: str, travel_from: str, travel_to: str,
-                experience: str, spend_level: str, model: str = "gpt-4o-mini") -> str:
+                experience: str, spend_level: str, model: str = "gpt-4o-mini",
+                session_id: str = None) -> Iterator[str]:
         try:
-            trip_details = TripDetails(
-                destination=destination,
-                travel_from=travel_from,
-                travel_to=travel_to,
-                travel_experience=experience,
-                spend_level=spend_level,
-                model=model
-            )
+            trip_details = self._build_trip_details(destination, travel_from, travel_to, experience, spend_level, model)
 
-            travel_planner = TravelPlanner(trip_details)
+            travel_planner = TravelPlanner(trip_details, session_id=session_id)
 
-            return travel_planner.generate_travel_plan()
+            # Yield the plan accumulated so far so the Markdown output fills in as tokens arrive
+            plan = ""
+            for chunk in travel_planner.stream_travel_plan():
+                plan += chunk
+                yield plan
+            if model == "auto" and travel_planner.routed_model:
+                yield plan + self._format_routing_note(travel_planner.routed_model)
 
         except Exception as e:
-            return self._format_error_message(str(e))
+            yield self._format_error_message(str(e))
+
+    async def aplan_trip(self, destination: str, travel_from: str, travel_to: str,
+                         experience: str, spend_level: str, model: str = "gpt-4o-mini",
+                         session_id: str = None) -> AsyncIterator[str]:
+        # Used by the UI: awaiting model and tool I/O leaves the worker free to serve other plans
+        try:
+            trip_details = self._build_trip_details(destination, travel_from, travel_to, experience, spend_level, model)
+
+            travel_planner = AsyncTravelPlanner(trip_details, session_id=session_id)
+
+            plan = ""
+            async for chunk in travel_planner.astream_travel_plan():
+                plan += chunk
+                yield plan
+            if model == "auto" and travel_planner.routed_model:
+                yield plan + self._format_routing_note(travel_planner.routed_model)
+
+        except Exception as e:
+            yield self._format_error_message(str(e))
+
+    def print_plan(self, destination: str, travel_from: str, travel_to: str, experience: str,
+                   spend_level: str, model: str = "gpt-4o-mini", out: TextIO = sys.stdout,
+                   sectioned: bool = None) -> int:
+        """Stream one plan to `out` without the web UI; returns a process exit code."""
+        errors = UI.validate_inputs(destination, travel_from, travel_to)
+        if errors:
+            for error in errors:
+                logger.error(error)
+            return 2
+
+        trip_details = self._build_trip_details(
+            destination.strip(), travel_from.strip(), travel_to.strip(), experience, spend_level, model
+        )
+        travel_planner = TravelPlanner(trip_details, sectioned=sectioned)
+        try:
+            for chunk in travel_planner.stream_travel_plan():
+                out.write(chunk)
+                out.flush()
+        except Exception as e:
+            logger.error(f"Planning failed: {e}")
+            return 1
+        if model == "auto" and travel_planner.routed_model:
+            logger.info(f"Planned with {travel_planner.routed_model} (auto)")
+        out.write("\n")
+        return 0
+
+    @staticmethod
+    def _format_routing_note(routed_model: str) -> str:
+        return f"\n\n---\n_Planned with **{routed_model}** (auto: picked by current load)_"
 
     def _format_error_message(self, error: str) -> str:
         return (
@@ -33,15 +108,64 @@ class App:
         )
 
     def start(self) -> None:
-        print("🌍 Starting AI Travel Planner...")
-        print("🚀 Launching Gradio interface...")
+        logger.info("🌍 Starting AI Travel Planner...")
+        if os.getenv("OLLAMA_WARM_UP", "false").lower() in ("1", "true", "yes"):
+            # Load the local model in the background so the UI comes up immediately
+            threading.Thread(target=Ollama.warm_up, name="ollama-warm-up", daemon=True).start()
+        metrics_port = int(os.getenv("METRICS_PORT", "9464"))
+        if metrics_port:
+            start_metrics_server(metrics_port, os.getenv("METRICS_HOST", "127.0.0.1"))
+        logger.info("🚀 Launching Gradio interface...")
         self.ui.launch()
 
 
-def main():
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="AI Travel Planner")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("serve", help="launch the Gradio web UI (default)")
+
+    plan = subparsers.add_parser("plan", help="print one travel plan to stdout without loading the web UI")
+    plan.add_argument("--destination", required=True)
+    plan.add_argument("--from", dest="travel_from", required=True, help="start date, YYYY-MM-DD")
+    plan.add_argument("--to", dest="travel_to", required=True, help="end date, YYYY-MM-DD")
+    plan.add_argument("--experience", choices=["adventurous", "relaxing", "cultural", "luxury"], default="cultural")
+    plan.add_argument("--spend-level", choices=["budget", "average", "luxury"], default="average")
+    plan.add_argument("--model", choices=["gpt-4o-mini", "llama2", "auto"], default="gpt-4o-mini")
+    plan.add_argument("--sectioned", action="store_true", default=None,
+                      help="generate the plan's sections as concurrent completions (default: SECTIONED_PLANS)")
+
+    batch = subparsers.add_parser("batch", help="plan every trip of a JSONL file into an output JSONL file")
+    batch.add_argument("input", help="JSONL file, one TripDetails object (and an optional id) per line")
+    batch.add_argument("output", help="JSONL results file; also the checkpoint that --no-resume ignores")
+    batch.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "8")))
+    batch.add_argument("--no-resume", dest="resume", action="store_false",
+                       help="overwrite the output instead of skipping trips it already contains")
+
+    cities = subparsers.add_parser("import-cities", help="load OpenWeatherMap's city list into the local city index")
+    cities.add_argument("path", help="city.list.json or city.list.json.gz from bulk.openweathermap.org/sample/")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Logs go to stderr, so a headless plan on stdout can be piped or redirected cleanly
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    if args.command == "import-cities":
+        city_index.import_owm_city_list(args.path)
+        return 0
+    if args.command == "batch":
+        stats = run_batch(args.input, args.output, concurrency=args.concurrency, resume=args.resume)
+        return 1 if stats["failed"] else 0
     app = App()
+    if args.command == "plan":
+        return app.print_plan(args.destination, args.travel_from, args.travel_to,
+                              args.experience, args.spend_level, args.model, sectioned=args.sectioned)
     app.start()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
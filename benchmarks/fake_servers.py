@@ -0,0 +1,291 @@
+import base64
+import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+OPENAI_MIN_CACHED_TOKENS = 1024
+
+# 1x1 transparent PNG returned by the fake image endpoint
+TINY_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+@dataclass
+class FakeServerConfig:
+    latency_ms: float = 200.0          # delay before the first byte of every response
+    tokens_per_second: float = 100.0   # generation speed of the fake LLMs (0 = instant)
+    plan_tokens: int = 400             # length of a generated plan in tokens
+    tool_calls: str = "weather"        # "weather" asks for get_weather on the first turn, "none" never calls tools
+    image_latency_ms: float = 1000.0
+    weather_latency_ms: float = 150.0
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: FakeServerConfig = None
+    seen_prefixes: set = None  # system prompts already "cached", shared by all requests of one server
+
+    def log_message(self, format, *args):
+        pass
+
+    # Requests may arrive with an absolute URI when the server is used as pyowm's HTTP proxy
+    def _route(self):
+        parts = urlsplit(self.path)
+        return parts.path, parse_qs(parts.query)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _sleep(self, milliseconds: float):
+        if milliseconds > 0:
+            time.sleep(milliseconds / 1000.0)
+
+    def _tokens(self):
+        delay = 1.0 / self.config.tokens_per_second if self.config.tokens_per_second > 0 else 0
+        for i in range(self.config.plan_tokens):
+            if delay:
+                time.sleep(delay)
+            yield f"word{i} " if i % 12 else f"\n\n## Section {i // 12 + 1}\n"
+
+    def _cached_prompt_tokens(self, backend: str, messages: list) -> int:
+        # Like the real providers, a repeated system prompt is served from the prompt cache;
+        # OpenAI only caches prefixes of at least OPENAI_MIN_CACHED_TOKENS (about 4 characters each)
+        system_prompt = messages[0].get("content", "") if messages and messages[0].get("role") == "system" else ""
+        if backend == "openai" and len(system_prompt) / 4 < OPENAI_MIN_CACHED_TOKENS:
+            return 0
+        cached = (backend, system_prompt) in self.seen_prefixes
+        self.seen_prefixes.add((backend, system_prompt))
+        return len(system_prompt.split()) if cached else 0
+
+    def _wants_tool_call(self, messages: list) -> bool:
+        if self.config.tool_calls == "none":
+            return False
+        return not any(m.get("role") == "tool" for m in messages)
+
+    def do_POST(self):
+        path, _ = self._route()
+        if path.endswith("/chat/completions"):
+            self._openai_chat(self._read_json())
+        elif path.endswith("/images/generations"):
+            self._read_json()
+            self._sleep(self.config.image_latency_ms)
+            self._send_json({"created": int(time.time()), "data": [{"b64_json": base64.b64encode(TINY_PNG).decode()}]})
+        elif path == "/api/chat":
+            self._ollama_chat(self._read_json())
+        else:
+            self._send_json({"error": f"unknown path {path}"}, status=404)
+
+    def do_GET(self):
+        path, query = self._route()
+        if path.endswith("/forecast"):
+            self._sleep(self.config.weather_latency_ms)
+            self._send_json(self._forecast(query.get("q", ["Paris"])[0], query.get("units", [""])[0]))
+        else:
+            self._send_json({"error": f"unknown path {path}"}, status=404)
+
+    def _openai_chat(self, request: dict):
+        self._sleep(self.config.latency_ms)
+        messages = request.get("messages", [])
+        tool_call = None
+        if request.get("tools") and self._wants_tool_call(messages):
+            tool_call = {
+                "id": "call_bench_1",
+                "type": "function",
+                "function": {
+                    "name": "get_weather",
+                    "arguments": json.dumps({"destination_city": "Paris", "travel_from": _first_forecast_day()}),
+                },
+            }
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        cached_tokens = self._cached_prompt_tokens("openai", messages)
+
+        if not request.get("stream"):
+            content = None if tool_call else "".join(self._tokens())
+            self._send_json({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content, **({"tool_calls": [tool_call]} if tool_call else {})},
+                    "finish_reason": "tool_calls" if tool_call else "stop",
+                }],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": self.config.plan_tokens,
+                          "total_tokens": prompt_tokens + self.config.plan_tokens,
+                          "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+            })
+            return
+
+        def event(delta: dict, finish_reason=None) -> bytes:
+            chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        self._start_chunked("text/event-stream")
+        if tool_call:
+            self._write_chunk(event({"role": "assistant", "tool_calls": [{"index": 0, **tool_call}]}))
+            self._write_chunk(event({}, "tool_calls"))
+        else:
+            for token in self._tokens():
+                self._write_chunk(event({"content": token}))
+            self._write_chunk(event({}, "stop"))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            completion_tokens = 0 if tool_call else self.config.plan_tokens
+            usage_chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model"),
+                "choices": [],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens,
+                          "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+            }
+            self._write_chunk(f"data: {json.dumps(usage_chunk)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._end_chunked()
+
+    def _ollama_chat(self, request: dict):
+        self._sleep(self.config.latency_ms)
+        messages = request.get("messages", [])
+        if not messages:
+            # Warm-up request: the model is "loaded"
+            self._send_json({"model": request.get("model"), "done": True, "done_reason": "load"})
+            return
+
+        system_prompt = messages[0].get("content", "") if messages[0].get("role") == "system" else ""
+        if "respond ONLY with JSON" in system_prompt and self._wants_tool_call(messages):
+            tokens = [json.dumps({"tool": "get_weather", "arguments": {
+                "destination_city": "Paris", "travel_from": _first_forecast_day()}})]
+        else:
+            tokens = self._tokens()
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        evaluated_tokens = prompt_tokens - self._cached_prompt_tokens("ollama", messages)
+
+        def line(content: str, done: bool = False, eval_count: int = 0) -> bytes:
+            payload = {"model": request.get("model"), "created_at": datetime.now(timezone.utc).isoformat(),
+                       "message": {"role": "assistant", "content": content}, "done": done}
+            if done:
+                payload.update({"eval_count": eval_count, "eval_duration": int(eval_count * 1e9 / (self.config.tokens_per_second or 1000)),
+                                "prompt_eval_count": evaluated_tokens,
+                                # Prefill runs roughly 20x faster than generation
+                                "prompt_eval_duration": int(evaluated_tokens * 1e9 / (20 * (self.config.tokens_per_second or 1000)))})
+            return (json.dumps(payload) + "\n").encode("utf-8")
+
+        if not request.get("stream"):
+            content = "".join(tokens)
+            body = line(content, done=True, eval_count=len(content.split()))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self._start_chunked("application/x-ndjson")
+        count = 0
+        for token in tokens:
+            count += 1
+            self._write_chunk(line(token))
+        self._write_chunk(line("", done=True, eval_count=count))
+        self._end_chunked()
+
+    def _forecast(self, city: str, units: str) -> dict:
+        start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        start -= timedelta(hours=start.hour % 3)
+        items = []
+        for step in range(40):
+            moment = start + timedelta(hours=3 * step)
+            celsius = 12.0 + (step % 8)
+            temp = celsius if units == "metric" else celsius + 273.15
+            items.append({
+                "dt": int(moment.timestamp()),
+                "main": {"temp": temp, "feels_like": temp, "temp_min": temp, "temp_max": temp,
+                         "pressure": 1015, "sea_level": 1015, "grnd_level": 1010, "humidity": 70, "temp_kf": 0},
+                "weather": [{"id": 500, "main": "Rain" if step % 5 == 0 else "Clouds", "description": "", "icon": "10d"}],
+                "clouds": {"all": 75},
+                "wind": {"speed": 4.1, "deg": 220},
+                "visibility": 10000,
+                "pop": 0.2,
+                "sys": {"pod": "d"},
+                "dt_txt": moment.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+        return {
+            "cod": "200", "message": 0, "cnt": len(items), "list": items,
+            "city": {"id": 2988507, "name": city, "coord": {"lat": 48.8534, "lon": 2.3488}, "country": "FR",
+                     "population": 0, "timezone": 0, "sunrise": 0, "sunset": 0},
+        }
+
+
+def _first_forecast_day() -> str:
+    return (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+class FakeServers:
+    """One local HTTP server standing in for the OpenAI, Ollama and OpenWeatherMap APIs."""
+
+    def __init__(self, config: FakeServerConfig, host: str = "127.0.0.1", port: int = 0):
+        handler = type("FakeHandler", (_FakeHandler,), {"config": config, "seen_prefixes": set()})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-servers", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self) -> dict:
+        """Environment variables that point every client in the app at this server."""
+        return {
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+            "OPENAI_API_KEY": "bench-key",
+            "OPENAI_HTTP2": "false",
+            "OLLAMA_HOST": self.base_url,
+            "OWM_API_URL": f"{self.base_url}/data/2.5",
+            "OWM_PROXY": self.base_url,
+            "OWM_USE_SSL": "false",
+            "OPEN_WEATHER_API_KEY": "bench-key",
+        }
+
+    def start(self) -> "FakeServers":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,82 @@
+"""Cold-start benchmark: how long the entry modules take to import, and what they drag in.
+
+Each module is imported in a fresh interpreter several times and the median is reported, along with
+any heavy dependency that got loaded on the way. Run it before and after touching imports:
+
+    python -m benchmarks.import_time --repeat 5 --max-ms 800
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules that must stay behind lazy imports; loading any of them at import time is a regression
+HEAVY_MODULES = ("gradio", "openai", "PIL", "pyowm")
+
+DEFAULT_MODULES = ("app", "services.traveler_planner", "services.async_travel_planner")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of the planner's entry modules.")
+    parser.add_argument("--modules", nargs="+", default=list(DEFAULT_MODULES))
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--max-ms", type=float, help="fail when a module's median import time exceeds this")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def measure(module: str, repeat: int) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    heavy = set()
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=root, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        heavy.update(result["heavy"])
+    return {
+        "module": module,
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "heavy_modules": sorted(heavy),
+    }
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    rows = [measure(module, args.repeat) for module in args.modules]
+
+    print(f"{'module':<34} {'median ms':>10} {'min ms':>8}  heavy imports")
+    for row in rows:
+        print(f"{row['module']:<34} {row['median_ms']:>10.1f} {row['min_ms']:>8.1f}  "
+              f"{', '.join(row['heavy_modules']) or '-'}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"arguments": vars(args), "results": rows}, f, indent=2)
+
+    failed = [row for row in rows if row["heavy_modules"]]
+    if args.max_ms is not None:
+        failed += [row for row in rows if row["median_ms"] > args.max_ms and row not in failed]
+    for row in failed:
+        print(f"FAIL {row['module']}: median {row['median_ms']:.0f} ms, heavy imports {row['heavy_modules']}",
+              file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
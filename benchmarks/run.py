@@ -0,0 +1,162 @@
+"""Offline throughput/latency benchmark of the planning pipeline.
+
+Starts local stand-ins for OpenAI, Ollama and OpenWeatherMap, points the app at them and drives
+App.plan_trip (sync) or App.aplan_trip (async) at fixed concurrency levels:
+
+    python -m benchmarks.run --concurrency 1 8 32 --requests 64 --pipeline async
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from benchmarks.fake_servers import FakeServerConfig, FakeServers
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the travel planner against local fake APIs.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="plans per concurrency level")
+    parser.add_argument("--pipeline", choices=["sync", "async"], default="async")
+    parser.add_argument("--model", choices=["gpt-4o-mini", "llama2", "auto"], default="gpt-4o-mini")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--plan-tokens", type=int, default=400)
+    parser.add_argument("--tool-calls", choices=["weather", "none"], default="weather")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def trip_arguments(model: str) -> tuple:
+    start = date.today() + timedelta(days=1)
+    return "Paris", start.isoformat(), (start + timedelta(days=3)).isoformat(), "cultural", "budget", model
+
+
+def run_sync_level(app, concurrency: int, total: int, model: str) -> list:
+    def one_plan(_):
+        started = time.perf_counter()
+        first_token = None
+        for _plan in app.plan_trip(*trip_arguments(model)):
+            if first_token is None:
+                first_token = time.perf_counter() - started
+        return time.perf_counter() - started, first_token
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(one_plan, range(total)))
+
+
+async def run_async_level(app, concurrency: int, total: int, model: str) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_plan():
+        async with semaphore:
+            started = time.perf_counter()
+            first_token = None
+            async for _plan in app.aplan_trip(*trip_arguments(model)):
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+            return time.perf_counter() - started, first_token
+
+    return await asyncio.gather(*(one_plan() for _ in range(total)))
+
+
+def summarize(concurrency: int, results: list, wall_seconds: float) -> dict:
+    latencies = [latency for latency, _ in results]
+    first_tokens = [ttft for _, ttft in results if ttft is not None]
+    return {
+        "concurrency": concurrency,
+        "plans": len(results),
+        "plans_per_second": len(results) / wall_seconds if wall_seconds else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "ttft_p50_ms": percentile(first_tokens, 50) * 1000,
+        "ttft_p95_ms": percentile(first_tokens, 95) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def print_report(rows: list) -> None:
+    header = f"{'conc':>5} {'plans':>6} {'plans/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft p50':>9} {'ttft p95':>9} {'rss MB':>7}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['concurrency']:>5} {row['plans']:>6} {row['plans_per_second']:>8.2f} {row['p50_ms']:>8.0f} "
+              f"{row['p95_ms']:>8.0f} {row['p99_ms']:>8.0f} {row['ttft_p50_ms']:>9.0f} {row['ttft_p95_ms']:>9.0f} "
+              f"{row['peak_rss_mb']:>7.1f}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    servers = FakeServers(FakeServerConfig(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        plan_tokens=args.plan_tokens,
+        tool_calls=args.tool_calls,
+    )).start()
+
+    # Clients read their endpoints from the environment at import time, so configure it first.
+    # Plan caching is off so every request exercises the full pipeline.
+    os.environ.update(servers.environment())
+    cache_dir = tempfile.mkdtemp(prefix="planner-bench-")
+    os.environ.update({
+        "PLAN_CACHE_ENABLED": "false",
+        "PLAN_CACHE_PATH": os.path.join(cache_dir, "plans.sqlite3"),
+        "IMAGE_CACHE_DIR": os.path.join(cache_dir, "images"),
+        "CITY_INDEX_PATH": os.path.join(cache_dir, "cities.sqlite3"),
+    })
+
+    from app import App
+
+    app = App()
+
+    async def run_async_levels() -> list:
+        # All levels share one event loop: the pooled async clients are bound to the loop that created them
+        async_rows = []
+        for concurrency in args.concurrency:
+            started = time.perf_counter()
+            results = await run_async_level(app, concurrency, args.requests, args.model)
+            async_rows.append(summarize(concurrency, results, time.perf_counter() - started))
+        return async_rows
+
+    try:
+        if args.pipeline == "async":
+            rows = asyncio.run(run_async_levels())
+        else:
+            rows = []
+            for concurrency in args.concurrency:
+                started = time.perf_counter()
+                results = run_sync_level(app, concurrency, args.requests, args.model)
+                rows.append(summarize(concurrency, results, time.perf_counter() - started))
+    finally:
+        servers.stop()
+
+    print(f"pipeline={args.pipeline} model={args.model} latency={args.latency_ms:.0f}ms "
+          f"tokens/s={args.tokens_per_second:.0f} plan_tokens={args.plan_tokens} tool_calls={args.tool_calls}")
+    print_report(rows)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"arguments": vars(args), "results": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+import threading
+
+from dotenv import load_dotenv
+
+_lock = threading.Lock()
+_loaded = False
+
+
+def load_config() -> None:
+    """Load `.env` into the process environment once; later calls are no-ops.
+
+    Modules that read settings at import time call this first, so the file is parsed
+    a single time no matter which entry point (UI, headless CLI, benchmarks) starts first.
+    """
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            load_dotenv(override=True)
+            _loaded = True
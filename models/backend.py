@@ -0,0 +1,100 @@
+import socket
+import threading
+from concurrent.futures import CancelledError
+from types import SimpleNamespace
+from typing import AsyncIterator, Iterator, Optional
+
+
+class Cancellation:
+    """Lets another thread abort a synchronous request that is blocked reading its response.
+
+    A backend hands every response it reads to ``watch``; ``cancel`` shuts their connections down,
+    so a read blocked in the request's thread fails at once and the thread closes the response as
+    usual. A response watched after ``cancel`` is closed straight away. The wait for the response
+    headers cannot be interrupted, nor a read on an HTTP/2 connection other requests share.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._responses = []
+        self._lock = threading.Lock()
+
+    def watch(self, response) -> None:
+        with self._lock:
+            if not self.cancelled:
+                self._responses.append(response)
+                return
+        response.close()
+        raise CancelledError("request was cancelled")
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            responses, self._responses = self._responses, []
+        for response in responses:
+            self.shutdown(response)
+
+    @staticmethod
+    def shutdown(response) -> None:
+        try:
+            if hasattr(response, "raw"):
+                # requests: urllib3 can shut its socket down from another thread
+                if hasattr(response.raw, "shutdown"):
+                    response.raw.shutdown()
+            elif response.http_version == "HTTP/1.1":
+                # httpx: the socket behind the response; closing it alone would not wake the reader
+                stream = response.extensions.get("network_stream")
+                sock = stream.get_extra_info("socket") if stream is not None else None
+                if sock is not None:
+                    sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # already closed
+
+
+class ChatBackend:
+    """A chat model the planner can hand a conversation to.
+
+    Conversations are kept in OpenAI chat format (assistant ``tool_calls`` followed by ``tool``
+    results) and every backend converts them to what its API expects in ``prepare_messages``, so
+    any round of a plan can be sent to any backend. ``stream``/``astream`` yield the reply's text
+    deltas and then, as their last item, the assembled assistant message: an object with
+    ``content`` and ``tool_calls`` (None, or objects with ``id`` and ``function.name/arguments``).
+    ``stream`` passes the responses it reads to ``cancellation``, when given, so a hedge that lost
+    can be cut off from another thread.
+    """
+    name = ""            # provider name for the outbound scheduler and the metrics
+    model_choice = ""    # TripDetails.model value that selects this backend
+    native_tools = True  # whether tool schemas go in the request rather than the prompt
+    # Used by "auto" routing: rounds the backend serves well at once, and the throughput
+    # assumed until some rounds have been measured
+    max_concurrency = 8
+    expected_tokens_per_second = 50.0
+
+    @classmethod
+    def prepare_messages(cls, messages: list, tools: list = None) -> list:
+        """A copy of the conversation in this backend's format; the planner may trim it in place."""
+        return [dict(message) for message in messages]
+
+    @classmethod
+    def complete(cls, messages: list, tools: list = None) -> Optional[SimpleNamespace]:
+        raise NotImplementedError
+
+    @classmethod
+    async def acomplete(cls, messages: list, tools: list = None) -> Optional[SimpleNamespace]:
+        raise NotImplementedError
+
+    @classmethod
+    def stream(cls, messages: list, tools: list = None, cancellation: Cancellation = None) -> Iterator:
+        raise NotImplementedError
+
+    @classmethod
+    def astream(cls, messages: list, tools: list = None) -> AsyncIterator:
+        raise NotImplementedError
+
+    @staticmethod
+    def message(content: str, tool_calls: list = None) -> SimpleNamespace:
+        return SimpleNamespace(content=content, tool_calls=tool_calls or None)
+
+    @staticmethod
+    def tool_call(call_id: str, name: str, arguments: str) -> SimpleNamespace:
+        return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
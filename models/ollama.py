@@ -1,10 +1,59 @@
+import json
+import logging
+import os
+import threading
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+
+from config import load_config
+from models.backend import Cancellation, ChatBackend
+from services.metrics import record_ollama_usage
+from services.scheduler import estimate_tokens, scheduler
+from services.token_budget import compact_json
+
+load_config()
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_host(host: str) -> str:
+    # OLLAMA_HOST is often set as "127.0.0.1:11434", the same value the Ollama server itself reads
+    if "://" not in host:
+        host = f"http://{host}"
+    return host.rstrip("/")
+
+
+def _parse_keep_alive(value: str):
+    # Ollama accepts durations ("30m") or seconds as a number (-1 keeps the model loaded forever)
+    try:
+        return int(value)
+    except ValueError:
+        return value
 
 
-class Ollama:
-    CHAT_API = "http://localhost:11434/api/chat"
+class Ollama(ChatBackend):
+    name = "ollama"
+    model_choice = "llama2"
+    # Ollama is prompted with the tool schemas and answers with a JSON tool request
+    native_tools = False
+    # A local server decodes a few requests in parallel (OLLAMA_NUM_PARALLEL); the rest queue up
+    max_concurrency = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+    expected_tokens_per_second = 30.0
+
+    HOST = _normalize_host(os.getenv("OLLAMA_HOST", "http://localhost:11434"))
+    CHAT_API = f"{HOST}/api/chat"
     HEADERS = {"Content-Type": "application/json"}
-    MODEL_NAME = "llama2"
+    MODEL_NAME = os.getenv("OLLAMA_MODEL", "llama2")
+    KEEP_ALIVE = _parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+    CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+    READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+    POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+
+    _session: requests.Session = None
+    _async_client: httpx.AsyncClient = None
+    _lock = threading.Lock()
 
     def __init__(self, messages: list):
         for m in messages:
@@ -12,27 +61,263 @@ class Ollama:
                 m["content"] = ""
         self.messages = messages
 
-    def get_payload(self):
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        if cls._session is None:
+            with cls._lock:
+                if cls._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cls.POOL_SIZE)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    session.headers.update(cls.HEADERS)
+                    cls._session = session
+        return cls._session
+
+    @classmethod
+    def get_async_client(cls) -> httpx.AsyncClient:
+        if cls._async_client is None:
+            with cls._lock:
+                if cls._async_client is None:
+                    cls._async_client = httpx.AsyncClient(
+                        headers=cls.HEADERS,
+                        limits=httpx.Limits(max_connections=cls.POOL_SIZE, max_keepalive_connections=cls.POOL_SIZE),
+                        timeout=httpx.Timeout(cls.READ_TIMEOUT, connect=cls.CONNECT_TIMEOUT),
+                    )
+        return cls._async_client
+
+    @classmethod
+    def get_timeout(cls) -> tuple:
+        return cls.CONNECT_TIMEOUT, cls.READ_TIMEOUT
+
+    @classmethod
+    def warm_up(cls) -> None:
+        """Load the model into memory ahead of the first request."""
+        logger.info(f"Warming up Ollama model {cls.MODEL_NAME} at {cls.HOST}...")
+        # A chat request without messages only loads the model and applies keep_alive
+        payload = {"model": cls.MODEL_NAME, "messages": [], "keep_alive": cls.KEEP_ALIVE}
+        try:
+            scheduler.call("ollama", lambda: cls._send(payload).close())
+            logger.info(f"Ollama model {cls.MODEL_NAME} is loaded.")
+        except requests.RequestException as e:
+            logger.warning(f"Ollama warm-up failed: {e}")
+
+    @classmethod
+    def _send(cls, payload: dict, stream: bool = False) -> requests.Response:
+        response = cls.get_session().post(cls.CHAT_API, json=payload, timeout=cls.get_timeout(), stream=stream)
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+        return response
+
+    @classmethod
+    async def _asend(cls, payload: dict, stream: bool = False) -> httpx.Response:
+        client = cls.get_async_client()
+        response = await client.send(client.build_request("POST", cls.CHAT_API, json=payload), stream=stream)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError:
+            await response.aclose()
+            raise
+        return response
+
+    def post(self, stream: bool = False) -> requests.Response:
+        # Retries (e.g. while the server is still loading the model) happen before any chunk is read
+        payload = self.get_payload(stream)
+        return scheduler.call("ollama", lambda: self._send(payload, stream), tokens=estimate_tokens(self.messages))
+
+    async def apost(self, stream: bool = False) -> httpx.Response:
+        payload = self.get_payload(stream)
+        return await scheduler.acall(
+            "ollama", lambda: self._asend(payload, stream), tokens=estimate_tokens(self.messages)
+        )
+
+    def get_payload(self, stream: bool = False):
         return {
             "model": self.MODEL_NAME,
             "messages": self.messages,
-            "stream": False
+            "stream": stream,
+            "keep_alive": self.KEEP_ALIVE
         }
 
     def initialize_client(self):
-        print(f"Calling Ollama API in CHAT mode with {len(self.messages)} messages...")
-        payload = self.get_payload()
+        logger.info(f"Calling Ollama API in CHAT mode with {len(self.messages)} messages...")
 
         try:
-            response = requests.post(
-                self.CHAT_API,
-                json=payload,
-                headers=self.HEADERS
-            )
-
-            response.raise_for_status()
+            response = self.post()
             data = response.json()
+            record_ollama_usage(data)
             return data
         except requests.RequestException as e:
             raise RuntimeError(f"Failed to connect to Ollama API: {e}")
 
+    def stream_client(self, cancellation: Cancellation = None):
+        logger.info(f"Streaming Ollama API in CHAT mode with {len(self.messages)} messages...")
+
+        try:
+            with self.post(stream=True) as response:
+                if cancellation is not None:
+                    cancellation.watch(response)
+                # Ollama streams newline-delimited JSON objects, the last one has "done": true
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(f"Ollama API returned an error: {chunk['error']}")
+                    if chunk.get("done"):
+                        record_ollama_usage(chunk)
+                    yield chunk
+                    if chunk.get("done"):
+                        break
+        except requests.RequestException as e:
+            raise RuntimeError(f"Failed to connect to Ollama API: {e}")
+
+    async def ainitialize_client(self):
+        logger.info(f"Calling Ollama API (async) in CHAT mode with {len(self.messages)} messages...")
+
+        try:
+            response = await self.apost()
+            data = response.json()
+            record_ollama_usage(data)
+            return data
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Failed to connect to Ollama API: {e}")
+
+    async def astream_client(self):
+        logger.info(f"Streaming Ollama API (async) in CHAT mode with {len(self.messages)} messages...")
+
+        try:
+            response = await self.apost(stream=True)
+            try:
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(f"Ollama API returned an error: {chunk['error']}")
+                    if chunk.get("done"):
+                        record_ollama_usage(chunk)
+                    yield chunk
+                    if chunk.get("done"):
+                        break
+            finally:
+                await response.aclose()
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Failed to connect to Ollama API: {e}")
+
+    @staticmethod
+    def add_tool_instructions(messages: list, tools: list) -> None:
+        # Only the function schemas, without whitespace: every character here is prefill on a local model
+        tools_text = "\n\nTOOLS AVAILABLE:\n" + compact_json([tool["function"] for tool in tools])
+        messages[0]["content"] += tools_text
+        messages[0]["content"] += (
+            "\n\nIf you need to use a tool, respond ONLY with JSON in the format:\n"
+            '{"tool": "<tool_name>", "arguments": { ... }}\n'
+            "Otherwise, respond with your final travel plan in Markdown."
+        )
+
+    @classmethod
+    def prepare_messages(cls, messages: list, tools: list = None) -> list:
+        prepared = []
+        for message in messages:
+            message = dict(message)
+            if message.get("tool_calls"):
+                # Earlier tool requests are replayed in the JSON form the model was asked to use
+                message["content"] = "\n".join(
+                    json.dumps({"tool": call["function"]["name"],
+                                "arguments": json.loads(call["function"]["arguments"] or "{}")})
+                    for call in message.pop("tool_calls")
+                )
+            prepared.append(message)
+        if tools:
+            cls.add_tool_instructions(prepared, tools)
+        return prepared
+
+    @classmethod
+    def parse_tool_call(cls, reply: str):
+        """Return a tool-call message if the reply is a JSON tool request, otherwise None."""
+        try:
+            tool_call = json.loads(reply)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(tool_call, dict) or "tool" not in tool_call:
+            return None
+
+        return cls.message("", [
+            cls.tool_call("ollama-tool-1", tool_call["tool"], json.dumps(tool_call.get("arguments", {})))
+        ])
+
+    @classmethod
+    def reply_message(cls, reply: str, tools: list = None):
+        message = cls.parse_tool_call(reply) if tools else None
+        return message or cls.message(reply)
+
+    @staticmethod
+    def extract_reply(response) -> str:
+        if not isinstance(response, dict):
+            return ""
+        # Chat mode answers with "message", generate mode with "response"
+        if isinstance(response.get("message"), dict):
+            return response["message"].get("content") or ""
+        return response.get("response") or response.get("content") or ""
+
+    @classmethod
+    def complete(cls, messages: list, tools: list = None):
+        return cls.reply_message(cls.extract_reply(cls(messages).initialize_client()), tools)
+
+    @classmethod
+    async def acomplete(cls, messages: list, tools: list = None):
+        return cls.reply_message(cls.extract_reply(await cls(messages).ainitialize_client()), tools)
+
+    @classmethod
+    def stream(cls, messages: list, tools: list = None, cancellation: Cancellation = None):
+        # When a tool call is possible, a reply that starts with '{' is held back until it is
+        # complete so that a JSON tool request never reaches the user
+        reply = ""
+        holding = bool(tools)
+        for chunk in cls(messages).stream_client(cancellation):
+            delta = (chunk.get("message") or {}).get("content", "")
+            if not delta:
+                continue
+            reply += delta
+
+            if not holding:
+                yield delta
+                continue
+
+            stripped = reply.lstrip()
+            if stripped and not stripped.startswith("{"):
+                holding = False
+                yield reply
+
+        message = cls.reply_message(reply, tools)
+        if holding and not message.tool_calls and reply:
+            yield reply
+        yield message
+
+    @classmethod
+    async def astream(cls, messages: list, tools: list = None):
+        reply = ""
+        holding = bool(tools)
+        async for chunk in cls(messages).astream_client():
+            delta = (chunk.get("message") or {}).get("content", "")
+            if not delta:
+                continue
+            reply += delta
+
+            if not holding:
+                yield delta
+                continue
+
+            stripped = reply.lstrip()
+            if stripped and not stripped.startswith("{"):
+                holding = False
+                yield reply
+
+        message = cls.reply_message(reply, tools)
+        if holding and not message.tool_calls and reply:
+            yield reply
+        yield message
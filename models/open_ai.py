@@ -1,21 +1,237 @@
+import importlib.util
+import logging
 import os
-from dotenv import load_dotenv
-from openai import OpenAI
+import threading
+import time
+from typing import TYPE_CHECKING
 
-load_dotenv(override=True)
+import httpx
 
+from config import load_config
+from models.backend import Cancellation, ChatBackend
+from services.metrics import record_openai_usage
+from services.scheduler import estimate_tokens, scheduler
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+load_config()
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIModel(ChatBackend):
+    name = "openai"
+    model_choice = "gpt-4o-mini"
+    max_concurrency = int(os.getenv("OPENAI_MAX_CONCURRENCY", "64"))
+    expected_tokens_per_second = 80.0
+
+    # One client per process so every call reuses the same connection pool and TLS sessions
+    _client: "OpenAI" = None
+    _async_client: "AsyncOpenAI" = None
+    _lock = threading.Lock()
 
-class OpenAIModel:
     def __init__(self):
         self.initialize_client()
 
-
     @staticmethod
-    def initialize_client():
-        print("Calling OpenAI API...")
+    def get_api_key() -> str:
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is not set")
-        return OpenAI(api_key=api_key)
+        return api_key
+
+    @staticmethod
+    def get_http_options() -> dict:
+        http2 = os.getenv("OPENAI_HTTP2", "true").lower() in ("1", "true", "yes")
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested for OpenAI but the 'h2' package is not installed, using HTTP/1.1")
+            http2 = False
+
+        return {
+            "http2": http2,
+            "limits": httpx.Limits(
+                max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")),
+                keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60")),
+            ),
+            "timeout": httpx.Timeout(
+                float(os.getenv("OPENAI_TIMEOUT", "60")),
+                connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")),
+            ),
+        }
+
+    @classmethod
+    def initialize_client(cls) -> "OpenAI":
+        if cls._client is None:
+            with cls._lock:
+                if cls._client is None:
+                    # Imported on first use: the SDK is slow to import and headless Ollama runs never need it
+                    from openai import OpenAI
+
+                    logger.info("Initializing shared OpenAI client...")
+                    cls._client = OpenAI(
+                        api_key=cls.get_api_key(),
+                        # Retries and backoff are owned by the outbound scheduler
+                        max_retries=0,
+                        http_client=httpx.Client(**cls.get_http_options()),
+                    )
+        return cls._client
+
+    @classmethod
+    def initialize_async_client(cls) -> "AsyncOpenAI":
+        if cls._async_client is None:
+            with cls._lock:
+                if cls._async_client is None:
+                    from openai import AsyncOpenAI
+
+                    logger.info("Initializing shared async OpenAI client...")
+                    cls._async_client = AsyncOpenAI(
+                        api_key=cls.get_api_key(),
+                        max_retries=0,
+                        http_client=httpx.AsyncClient(**cls.get_http_options()),
+                    )
+        return cls._async_client
+
+    @classmethod
+    def create_chat_completion(cls, request: dict):
+        tokens = estimate_tokens(request["messages"], request.get("max_tokens", 0))
+        return scheduler.call(
+            "openai", lambda: cls.initialize_client().chat.completions.create(**request), tokens=tokens
+        )
+
+    @classmethod
+    async def acreate_chat_completion(cls, request: dict):
+        tokens = estimate_tokens(request["messages"], request.get("max_tokens", 0))
+        return await scheduler.acall(
+            "openai", lambda: cls.initialize_async_client().chat.completions.create(**request), tokens=tokens
+        )
+
+    @staticmethod
+    def get_chat_request(messages: list, tools: list = None, stream: bool = False) -> dict:
+        request = {
+            "model": "gpt-4o-mini",
+            "messages": messages,
+            "max_tokens": 2000,
+            "temperature": 0.7,
+        }
+        if tools:
+            request["tools"] = tools
+        if stream:
+            request["stream"] = True
+            # The final chunk then carries token usage for the metrics
+            request["stream_options"] = {"include_usage": True}
+        return request
+
+    @classmethod
+    def complete(cls, messages: list, tools: list = None):
+        response = cls.create_chat_completion(cls.get_chat_request(messages, tools))
+        record_openai_usage(response.usage)
+        return response.choices[0].message if response.choices else None
+
+    @classmethod
+    async def acomplete(cls, messages: list, tools: list = None):
+        response = await cls.acreate_chat_completion(cls.get_chat_request(messages, tools))
+        record_openai_usage(response.usage)
+        return response.choices[0].message if response.choices else None
+
+    @staticmethod
+    def accumulate_tool_calls(tool_calls: dict, delta) -> None:
+        # Tool calls arrive in fragments keyed by index; the arguments JSON is split across chunks
+        for tc in delta.tool_calls or []:
+            call = tool_calls.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+            if tc.id:
+                call["id"] = tc.id
+            if tc.function:
+                call["name"] += tc.function.name or ""
+                call["arguments"] += tc.function.arguments or ""
+
+    @classmethod
+    def streamed_message(cls, content: str, tool_calls: dict):
+        return cls.message(content, [
+            cls.tool_call(call["id"], call["name"], call["arguments"])
+            for _, call in sorted(tool_calls.items())
+        ])
+
+    @classmethod
+    def stream(cls, messages: list, tools: list = None, cancellation: Cancellation = None):
+        stream = cls.create_chat_completion(cls.get_chat_request(messages, tools, stream=True))
+
+        content = ""
+        tool_calls = {}
+        usage = None
+        first_chunk_at = None
+        try:
+            if cancellation is not None:
+                cancellation.watch(stream.response)
+            for chunk in stream:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+
+                if delta.content:
+                    content += delta.content
+                    yield delta.content
+                cls.accumulate_tool_calls(tool_calls, delta)
+        finally:
+            # Releases the connection right away when the stream is abandoned, e.g. by a hedge that lost
+            if hasattr(stream, "close"):
+                stream.close()
+
+        record_openai_usage(usage, time.perf_counter() - first_chunk_at if first_chunk_at else None)
+        yield cls.streamed_message(content, tool_calls)
+
+    @classmethod
+    async def astream(cls, messages: list, tools: list = None):
+        stream = await cls.acreate_chat_completion(cls.get_chat_request(messages, tools, stream=True))
+
+        content = ""
+        tool_calls = {}
+        usage = None
+        first_chunk_at = None
+        try:
+            async for chunk in stream:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+
+                if delta.content:
+                    content += delta.content
+                    yield delta.content
+                cls.accumulate_tool_calls(tool_calls, delta)
+        finally:
+            if hasattr(stream, "close"):
+                await stream.close()
+
+        record_openai_usage(usage, time.perf_counter() - first_chunk_at if first_chunk_at else None)
+        yield cls.streamed_message(content, tool_calls)
+
+    @classmethod
+    def generate_image(cls, request: dict, key: str = None, timeout: float = None):
+        # The SDK reads an explicit timeout=None as "no timeout", so it is only passed when set
+        options = {"timeout": timeout} if timeout is not None else {}
+        return scheduler.call(
+            "openai", lambda: cls.initialize_client().images.generate(**request, **options),
+            key=key, timeout=timeout
+        )
 
+    @classmethod
+    async def agenerate_image(cls, request: dict, key: str = None):
+        return await scheduler.acall(
+            "openai", lambda: cls.initialize_async_client().images.generate(**request), key=key
+        )
 
+    @classmethod
+    def close(cls) -> None:
+        with cls._lock:
+            if cls._client is not None:
+                cls._client.close()
+                cls._client = None
+            # The async client is dropped rather than awaited; its pool is released with the event loop
+            cls._async_client = None
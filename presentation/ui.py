@@ -1,16 +1,21 @@
-from typing import Callable
-import gradio as gr
+import os
+import uuid
+from typing import AsyncIterator, Callable
 from datetime import datetime, date
 
+from services.request_gate import RequestGate
+
 
 class UI:
-    prompt_function: Callable[[str, str, str, str, str, str], str]
+    prompt_function: Callable[..., AsyncIterator[str]]
 
-    def __init__(self, prompt_function: Callable[[str, str, str, str, str, str], str]):
+    def __init__(self, prompt_function: Callable[..., AsyncIterator[str]]):
         self.prompt_function = prompt_function
+        # A new submit replaces the session's running plan; PLAN_CONCURRENCY_LIMIT plans run at once
+        self.gate = RequestGate(int(os.getenv("PLAN_CONCURRENCY_LIMIT", "32")), self.format_queue_position)
 
-    def validate_and_process(self, destination, travel_from, travel_to, experience, spend_level, model="gpt-4o-mini") -> str:
-        """Validate inputs before calling the main prompt function"""
+    @staticmethod
+    def validate_inputs(destination, travel_from, travel_to) -> list:
         errors = []
 
         # Validate destination
@@ -48,14 +53,32 @@ class UI:
             if travel_from_date < today:
                 errors.append("Travel start date cannot be in the past")
 
+        return errors
+
+    async def validate_and_process(self, destination, travel_from, travel_to, experience, spend_level, model="gpt-4o-mini",
+                                   session_id=None) -> AsyncIterator[str]:
+        """Validate inputs before calling the main prompt function"""
+        errors = self.validate_inputs(destination, travel_from, travel_to)
+
         if errors:
             error_message = "**Validation Errors:**\n" + "\n".join(f"- {error}" for error in errors)
-            return error_message
+            yield error_message
+            return
+
+        # Stream the growing plan from the prompt function into the output
+        plan = self.prompt_function(destination.strip(), travel_from.strip(), travel_to.strip(), experience, spend_level, model,
+                                    session_id=session_id)
+        async for update in self.gate.run(session_id, plan):
+            yield update
 
-        # Call the prompt function and return the result directly (no streaming)
-        return self.prompt_function(destination.strip(), travel_from.strip(), travel_to.strip(), experience, spend_level, model)
+    @staticmethod
+    def format_queue_position(position: int) -> str:
+        return f"⏳ All planners are busy. Your trip is **#{position}** in the queue and will start automatically."
 
     def launch(self, share=False):
+        # Gradio takes seconds to import; deferring it keeps headless runs and validation free of it
+        import gradio as gr
+
         with gr.Blocks(title="AI Travel Planner", css="""
             #travel-output {
                 border-radius: 8px;
@@ -105,7 +128,7 @@ class UI:
 
                     with gr.Row():
                         model = gr.Dropdown(
-                            ["gpt-4o-mini", "llama2"],
+                            ["gpt-4o-mini", "llama2", "auto"],
                             label="🤖 AI Model",
                             value="gpt-4o-mini"
                         )
@@ -120,11 +143,19 @@ class UI:
                             elem_id = "travel-output"
                         )
 
+            # Identifies the browser session, so an edited trip only regenerates the sections it affects
+            session_id = gr.State(lambda: uuid.uuid4().hex)
+
             submit_btn.click(
                 fn=self.validate_and_process,
-                inputs=[destination, travel_from, travel_to, experience, spend_level, model],
+                inputs=[destination, travel_from, travel_to, experience, spend_level, model, session_id],
                 outputs=[output],
-                show_progress="full"  # show loading spinner during processing
+                show_progress="minimal",  # the streamed plan itself shows progress
+                # Every click goes through, so a new submit can replace the session's running plan
+                trigger_mode="multiple",
+                # Handlers are async, so many plans can be in flight on one worker; over
+                # PLAN_CONCURRENCY_LIMIT they wait in the gate, which reports their queue position
+                concurrency_limit=int(os.getenv("UI_CONCURRENCY_LIMIT", "100"))
             )
 
         return interface.launch(share=share)
@@ -1,7 +1,11 @@
-from typing import TypedDict
+from typing import List, TypedDict
 
 
-class CurrencyConversion(TypedDict):
+class _CurrencyConversionOptional(TypedDict, total=False):
+    amounts: List[float]
+
+
+class CurrencyConversion(_CurrencyConversionOptional):
     from_currency: str
     to_currency: str
     amount: float
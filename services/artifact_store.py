@@ -0,0 +1,95 @@
+import base64
+import hashlib
+import re
+from typing import AsyncIterator, Iterator, Optional
+
+HANDLE_PREFIX = "artifact://"
+HANDLE_LENGTH = len(HANDLE_PREFIX) + 12
+HANDLE_PATTERN = re.compile(r"artifact://[0-9a-f]{12}")
+
+
+class ArtifactStore:
+    """Binary tool outputs for one plan, kept out of the model context.
+
+    A tool deposits bytes and hands the model a short `artifact://<id>` handle instead. Once the
+    model has written the plan, every handle it used is replaced by the artifact itself (a data
+    URI), and artifacts it never referenced are appended at the end so nothing is lost.
+    """
+
+    def __init__(self):
+        self._artifacts = {}  # handle -> (mime type, bytes, description)
+        self._referenced = set()
+
+    def put(self, data: bytes, mime_type: str, description: str) -> str:
+        handle = HANDLE_PREFIX + hashlib.sha256(data).hexdigest()[:12]
+        self._artifacts[handle] = (mime_type, data, description)
+        return handle
+
+    def get(self, handle: str) -> Optional[bytes]:
+        artifact = self._artifacts.get(handle)
+        return artifact[1] if artifact else None
+
+    def data_uri(self, handle: str) -> str:
+        mime_type, data, _ = self._artifacts[handle]
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode()}"
+
+    def splice(self, text: str) -> str:
+        def replace(match) -> str:
+            handle = match.group(0)
+            if handle not in self._artifacts:
+                return handle
+            self._referenced.add(handle)
+            return self.data_uri(handle)
+
+        return HANDLE_PATTERN.sub(replace, text)
+
+    def unreferenced(self) -> str:
+        """Markdown for the images the model was given but did not place in the plan."""
+        return "".join(
+            f"\n\n![{description}]({self.data_uri(handle)})"
+            for handle, (mime_type, _, description) in self._artifacts.items()
+            if handle not in self._referenced and mime_type.startswith("image/")
+        )
+
+    @staticmethod
+    def _partial_handle_start(text: str) -> int:
+        """Index where a handle that may continue in the next chunk starts, or len(text)."""
+        for start in range(max(0, len(text) - HANDLE_LENGTH + 1), len(text)):
+            tail = text[start:]
+            if len(tail) <= len(HANDLE_PREFIX):
+                if HANDLE_PREFIX.startswith(tail):
+                    return start
+            elif tail.startswith(HANDLE_PREFIX) and all(c in "0123456789abcdef" for c in tail[len(HANDLE_PREFIX):]):
+                return start
+        return len(text)
+
+    def splice_stream(self, chunks: Iterator[str]) -> Iterator[str]:
+        # A handle can be split across chunks, so a possible partial handle is held back
+        pending = ""
+        for chunk in chunks:
+            if not self._artifacts:
+                yield chunk
+                continue
+            pending += chunk
+            cut = self._partial_handle_start(pending)
+            if cut:
+                yield self.splice(pending[:cut])
+            pending = pending[cut:]
+        tail = self.splice(pending) + self.unreferenced()
+        if tail:
+            yield tail
+
+    async def asplice_stream(self, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        pending = ""
+        async for chunk in chunks:
+            if not self._artifacts:
+                yield chunk
+                continue
+            pending += chunk
+            cut = self._partial_handle_start(pending)
+            if cut:
+                yield self.splice(pending[:cut])
+            pending = pending[cut:]
+        tail = self.splice(pending) + self.unreferenced()
+        if tail:
+            yield tail
@@ -0,0 +1,228 @@
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator, cast
+
+from services.llm_router import llm_router
+from services.metrics import TIME_TO_FIRST_TOKEN_SECONDS, span
+from services.token_budget import compact_json
+from services.traveler_planner import TravelPlanner
+from tools.currency import CurrencyConverterTool
+from tools.image import ImageGenerator
+from tools.weather import WeatherTool
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTravelPlanner(TravelPlanner):
+    """TravelPlanner on asyncio: model calls and tools await I/O instead of holding a thread."""
+
+    async def arun_tool(self, tool_call) -> str:
+        tool_name = tool_call.function.name
+        tool_args = json.loads(tool_call.function.arguments)
+
+        if tool_name == "get_weather":
+            prefetched = self.get_prefetched_weather(tool_args)
+            if prefetched is not None:
+                return prefetched
+            weather_tool = WeatherTool(
+                destination_city=tool_args["destination_city"],
+                travel_from=tool_args["travel_from"],
+                travel_to=tool_args.get("travel_to")
+            )
+            return compact_json(await weather_tool.aget_weather())
+        elif tool_name == "generate_image":
+            image_tool = ImageGenerator(
+                destination_city=tool_args["destination_city"],
+                trip_dates=tool_args["trip_dates"]
+            )
+            return self.image_tool_content(tool_args, await image_tool.agenerate_image_bytes())
+        elif tool_name == "convert_currency":
+            currency_tool = CurrencyConverterTool(data=tool_args["data"])
+            return compact_json(await currency_tool.aconvert_currency())
+
+        logger.warning(f"Unknown tool call: {tool_name}")
+        return compact_json({"error": f"Unknown tool: {tool_name}"})
+
+    async def arun_timed_tool(self, tool_call) -> str:
+        with span(f"tool:{tool_call.function.name}", self.get_model_choice()):
+            return await self.arun_tool(tool_call)
+
+    def astart_weather_prefetch(self, force: bool = False) -> None:
+        if not (self.prefetch_weather or force):
+            return
+        weather_tool = WeatherTool(
+            self.trip_details.destination, self.trip_details.travel_from, self.trip_details.travel_to
+        )
+        self._weather_prefetch = asyncio.ensure_future(weather_tool.aget_weather())
+
+    async def aadd_weather_context(self, messages: list) -> None:
+        if self._weather_prefetch is None:
+            return
+        task, self._weather_prefetch = self._weather_prefetch, None
+        try:
+            weather = await asyncio.wait_for(task, self.TOOL_TIMEOUTS["get_weather"])
+        except Exception as e:
+            logger.warning(f"Weather prefetch failed, falling back to the tool call: {e}")
+            return
+        self.inject_weather(messages, weather)
+
+    async def ahandle_tool(self, message):
+        tool_calls = message.tool_calls
+
+        if not tool_calls:
+            return None
+
+        async def run(tool_call) -> str:
+            tool_name = tool_call.function.name
+            timeout = self.TOOL_TIMEOUTS.get(tool_name, self.DEFAULT_TOOL_TIMEOUT)
+            try:
+                return await asyncio.wait_for(self.arun_timed_tool(tool_call), timeout)
+            except asyncio.TimeoutError:
+                return self.tool_timeout_content(tool_name, timeout)
+            except Exception as e:
+                return self.tool_error_content(tool_name, e)
+
+        contents = await asyncio.gather(*(run(tool_call) for tool_call in tool_calls))
+        return [self.tool_message(tool_call, content) for tool_call, content in zip(tool_calls, contents)]
+
+    async def _astream_round(self, messages: list, tools: list, offer_tools: bool, result: dict):
+        """Stream one model round; the assembled message is left in result["message"]."""
+        result["message"] = None
+        events = llm_router.astream(
+            self.get_model_choice(), lambda backend: self.prepare_round(backend, messages, tools, offer_tools)
+        )
+        async for event in events:
+            if isinstance(event, str):
+                yield event
+            else:
+                result["message"] = event
+
+    async def astream_travel_plan(self) -> AsyncIterator[str]:
+        # The plan cache is SQLite; its reads and writes are kept off the event loop
+        cache_key, cached_plan = await asyncio.to_thread(self.get_cached_plan)
+        if cached_plan is not None:
+            yield cached_plan
+            return
+
+        started = time.perf_counter()
+        plan = ""
+        with llm_router.plan(self.get_model_choice()) as backend:
+            self.routed_model = backend.model_choice
+            async for chunk in self.artifacts.asplice_stream(self._astream_travel_plan()):
+                if not plan:
+                    TIME_TO_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, model=self.get_model_choice())
+                plan += chunk
+                yield chunk
+        await asyncio.to_thread(self.store_plan, cache_key, plan)
+
+    async def agenerate_travel_plan(self) -> str:
+        return "".join([chunk async for chunk in self.astream_travel_plan()])
+
+    async def aget_section_messages(self) -> list:
+        with span("prompt_build", self.get_model_choice()):
+            self.load_session()
+            weather = self.get_session_weather()
+            if weather is None:
+                self.astart_weather_prefetch(force=True)
+            messages = cast(list, self.get_message())
+            if weather is None:
+                await self.aadd_weather_context(messages)
+            else:
+                self.inject_weather(messages, weather)
+        return self.split_into_sections(messages)
+
+    async def _astream_sectioned_plan(self) -> AsyncIterator[str]:
+        """Async counterpart of _stream_sectioned_plan: one task per section, streamed back in order."""
+        model_choice = self.get_model_choice()
+        sections = await self.aget_section_messages()
+        queues = [asyncio.Queue() for _ in sections]
+        semaphore = asyncio.Semaphore(max(1, self.SECTION_CONCURRENCY))
+
+        reusable = self.get_reusable_sections(sections)
+        for index, text in reusable.items():
+            queues[index].put_nowait(text)
+            queues[index].put_nowait(None)
+
+        async def run_section(index: int, key: str, messages: list) -> None:
+            try:
+                async with semaphore:
+                    with span(f"section:{key.split(':')[0]}", model_choice):
+                        events = llm_router.astream(
+                            model_choice, lambda backend: self.prepare_round(backend, messages, None, False)
+                        )
+                        async for event in events:
+                            if isinstance(event, str):
+                                queues[index].put_nowait(event)
+                queues[index].put_nowait(None)
+            except Exception as e:
+                queues[index].put_nowait(e)
+
+        # Tasks are created in plan order, so the semaphore lets the earliest sections start first
+        tasks = [asyncio.ensure_future(run_section(index, key, messages))
+                 for index, (key, _, messages) in enumerate(sections) if index not in reusable]
+        texts = [""] * len(sections)
+        try:
+            for index, section_queue in enumerate(queues):
+                separated = not any(texts)
+                while True:
+                    item = await section_queue.get()
+                    if item is None:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    if not separated:
+                        yield "\n\n"
+                        separated = True
+                    texts[index] += item
+                    yield item
+        finally:
+            # Cancelling a task aborts its HTTP stream
+            for task in tasks:
+                task.cancel()
+        self.remember_plan(sections, texts)
+
+    async def _astream_travel_plan(self) -> AsyncIterator[str]:
+        if self.sectioned:
+            emitted = False
+            async for chunk in self._astream_sectioned_plan():
+                emitted = True
+                yield chunk
+            if not emitted:
+                yield self.NO_PLAN_MESSAGE
+            return
+
+        model_choice = self.get_model_choice()
+        result = {}
+
+        with span("prompt_build", model_choice):
+            self.astart_weather_prefetch()
+            get_messages = cast(list, self.get_message())
+            get_tools = self.get_tools()
+            await self.aadd_weather_context(get_messages)
+
+        # Step 1: First model call, streamed while watching for tool requests
+        with span("first_llm_call", model_choice):
+            async for delta in self._astream_round(get_messages, get_tools, True, result):
+                yield delta
+        message = result["message"]
+        emitted = bool(message is not None and message.content)
+
+        # Step 2: If a tool was called, stream the second round
+        updated_response = None
+        if message is not None:
+            get_messages.append(self.assistant_message(message))
+            updated_response = await self.ahandle_tool(message)
+        if updated_response:
+            get_messages.extend(updated_response)
+            if emitted:
+                yield "\n\n"
+            with span("second_llm_call", model_choice):
+                async for delta in self._astream_round(get_messages, get_tools, False, result):
+                    yield delta
+            final_message = result["message"]
+            emitted = emitted or bool(final_message is not None and final_message.content)
+
+        if not emitted:
+            yield self.NO_PLAN_MESSAGE
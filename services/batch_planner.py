@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Iterator, TextIO
+
+from pydantic import ValidationError
+
+from schemas.trip_details import TripDetails
+from services.async_travel_planner import AsyncTravelPlanner
+from services.plan_cache import plan_cache
+
+logger = logging.getLogger(__name__)
+
+
+class BatchPlanner:
+    """Plans every trip of a JSONL file with bounded concurrency, appending results as they finish.
+
+    Each input line is a TripDetails object (``model`` defaults to gpt-4o-mini) with an optional
+    ``id``. Each output line is ``{"id", "line", "trip", "plan"}`` or ``{"id", "line", "error"}``.
+    The output file doubles as the checkpoint: on resume, ids that already have a plan are skipped.
+    A planner that gives up answers with one of its fallback messages; those trips are recorded as
+    errors so that a resumed run plans them again.
+    """
+    DEFAULT_MODEL = "gpt-4o-mini"
+    FALLBACK_PLANS = (AsyncTravelPlanner.NO_RESPONSE_MESSAGE, AsyncTravelPlanner.NO_PLAN_MESSAGE)
+
+    def __init__(self, concurrency: int = 8, prefetch_weather: bool = True, use_cache: bool = True):
+        self.concurrency = max(1, concurrency)
+        # The forecast is fetched once per city for the whole batch and handed to each plan up front
+        self.prefetch_weather = prefetch_weather
+        self.use_cache = use_cache
+        self.stats = {"planned": 0, "failed": 0, "skipped": 0, "duplicates": 0}
+        self._in_flight = {}  # plan cache key -> task, so identical trips in a batch are planned once
+
+    @staticmethod
+    def trip_id(trip_details: TripDetails) -> str:
+        normalized = json.dumps(plan_cache.normalize_trip(trip_details), sort_keys=True)
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def read_completed(output_path: str) -> set:
+        """Ids already planned successfully in an earlier run of the same output file."""
+        completed = set()
+        if not os.path.exists(output_path):
+            return completed
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write can leave a truncated last line; that trip is planned again
+                    continue
+                # Fallback messages written as plans by earlier versions are planned again too
+                if "plan" in record and record["plan"] not in BatchPlanner.FALLBACK_PLANS:
+                    completed.add(record["id"])
+        return completed
+
+    def parse_record(self, line: str) -> tuple:
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise TypeError(f"expected a JSON object, got {type(record).__name__}")
+        record.setdefault("model", self.DEFAULT_MODEL)
+        trip_id = record.pop("id", None)
+        trip_details = TripDetails(**record)
+        return str(trip_id) if trip_id is not None else self.trip_id(trip_details), trip_details
+
+    @staticmethod
+    def ends_mid_line(output_path: str) -> bool:
+        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+            return False
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    @staticmethod
+    def read_lines(input_path: str) -> Iterator[tuple]:
+        with open(input_path, encoding="utf-8") as f:
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield number, line
+
+    async def plan(self, trip_details: TripDetails) -> str:
+        planner = AsyncTravelPlanner(
+            trip_details, use_cache=self.use_cache, prefetch_weather=self.prefetch_weather
+        )
+        key = planner.get_cache_key()
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats["duplicates"] += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(planner.agenerate_travel_plan())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def run(self, input_path: str, output_path: str, resume: bool = True) -> dict:
+        completed = self.read_completed(output_path) if resume else set()
+        mode = "a" if resume else "w"
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending = set()
+        started = time.monotonic()
+
+        with open(output_path, mode, encoding="utf-8") as out:
+            if resume and self.ends_mid_line(output_path):
+                out.write("\n")
+
+            async def plan_one(number: int, trip_id: str, trip_details: TripDetails) -> None:
+                try:
+                    plan = await self.plan(trip_details)
+                    if plan in self.FALLBACK_PLANS:
+                        raise RuntimeError(plan)
+                    self.write(out, {"id": trip_id, "line": number, "trip": trip_details.model_dump(), "plan": plan})
+                    self.stats["planned"] += 1
+                except Exception as e:
+                    logger.warning(f"Trip {trip_id} (line {number}) failed: {e}")
+                    self.write(out, {"id": trip_id, "line": number, "error": str(e)})
+                    self.stats["failed"] += 1
+                finally:
+                    semaphore.release()
+
+                done = self.stats["planned"] + self.stats["failed"]
+                if done % 100 == 0:
+                    logger.info(f"Batch progress: {done} trips in {time.monotonic() - started:.0f}s")
+
+            for number, line in self.read_lines(input_path):
+                try:
+                    trip_id, trip_details = self.parse_record(line)
+                except (json.JSONDecodeError, TypeError, ValidationError) as e:
+                    self.write(out, {"id": None, "line": number, "error": f"Invalid trip record: {e}"})
+                    self.stats["failed"] += 1
+                    continue
+                if trip_id in completed:
+                    self.stats["skipped"] += 1
+                    continue
+
+                # Only `concurrency` trips are read ahead of the writer, so memory stays flat
+                await semaphore.acquire()
+                task = asyncio.ensure_future(plan_one(number, trip_id, trip_details))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            if pending:
+                await asyncio.gather(*pending)
+
+        logger.info(f"Batch finished in {time.monotonic() - started:.1f}s: {self.stats}")
+        return self.stats
+
+    @staticmethod
+    def write(out: TextIO, record: dict) -> None:
+        # One flushed line per trip: an interrupted run loses at most the trips still in flight
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+
+def run_batch(input_path: str, output_path: str, concurrency: int = 8, resume: bool = True,
+              prefetch_weather: bool = True) -> dict:
+    batch_planner = BatchPlanner(concurrency=concurrency, prefetch_weather=prefetch_weather)
+    return asyncio.run(batch_planner.run(input_path, output_path, resume=resume))
@@ -0,0 +1,428 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Iterator, Optional, Type
+
+from config import load_config
+from models.backend import Cancellation, ChatBackend
+from models.ollama import Ollama
+from models.open_ai import OpenAIModel
+from services.metrics import AUTO_ROUTES, LLM_FAILOVERS, LLM_HEDGES
+from services.scheduler import scheduler
+
+load_config()
+
+logger = logging.getLogger(__name__)
+
+# Only used while a round may be hedged: the first event of each candidate is awaited here
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_HEDGE_MAX_WORKERS", "32")),
+    thread_name_prefix="llm-hedge"
+)
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies per backend and call kind ("stream" or "complete")."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, backend: str, kind: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault((backend, kind), deque(maxlen=self.window)).append(seconds)
+
+    def count(self, backend: str, kind: str) -> int:
+        return len(self._samples.get((backend, kind), ()))
+
+    def percentile(self, backend: str, kind: str, pct: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._samples.get((backend, kind), ()))
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))]
+
+
+class BackendLoad:
+    """Live load of one backend: plans in flight, recent throughput and recent error rate."""
+    SMOOTHING = 0.2
+    # Rounds shorter than this (e.g. a bare tool call) say more about latency than throughput
+    MIN_SAMPLE_TOKENS = 50
+
+    def __init__(self, max_concurrency: int, tokens_per_second: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = 0.0
+        self.in_flight = 0
+
+    def record_round(self, tokens: int, seconds: float, failed: bool) -> None:
+        self.error_rate += self.SMOOTHING * ((1.0 if failed else 0.0) - self.error_rate)
+        if not failed and tokens >= self.MIN_SAMPLE_TOKENS and seconds > 0:
+            self.tokens_per_second += self.SMOOTHING * (tokens / seconds - self.tokens_per_second)
+
+    def estimate_seconds(self, tokens: int) -> float:
+        # Plans beyond the cap wait for a slot; a plan that fails has to be made again
+        queued = max(0, self.in_flight + 1 - self.max_concurrency)
+        seconds = tokens / self.tokens_per_second * (1 + queued / self.max_concurrency)
+        return seconds / max(0.05, 1.0 - self.error_rate)
+
+    def describe(self) -> str:
+        return (f"{self.in_flight}/{self.max_concurrency} plans, {self.tokens_per_second:.0f} tok/s, "
+                f"{self.error_rate:.0%} errors")
+
+
+class LLMRouter:
+    """Registry of chat backends, and the place every model round is sent through.
+
+    Without hedging a round simply goes to the backend of the trip's model. With hedging on, a round
+    that has not produced its first event (a streamed token, or the whole reply when not streaming)
+    by the primary backend's p95 latency is also sent to a backup backend, and a round whose primary
+    fails is moved to the backup. Whichever answers first is used; the other request is cancelled.
+    Synchronous hedged rounds are always streamed, so the losing request can be cut off mid-reply
+    from another thread (see `Cancellation`).
+
+    Trips with the "auto" model go to the backend expected to finish them first, judged by its
+    plans in flight against its concurrency cap, measured throughput, error rate and how long the
+    outbound scheduler would hold the request for rate limits.
+    """
+    AUTO = "auto"
+
+    def __init__(self, backends: list, hedge: bool = False, hedge_percentile: float = 95.0,
+                 min_samples: int = 20, default_deadline: float = 15.0, min_deadline: float = 1.0,
+                 auto_plan_tokens: int = 1500):
+        self.backends = {}
+        self.loads = {}
+        for backend in backends:
+            self.register(backend)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        # Until a backend has this many samples its deadline is `default_deadline`
+        self.min_samples = min_samples
+        self.default_deadline = default_deadline
+        self.min_deadline = min_deadline
+        # Completion tokens of a typical plan, the unit "auto" routing compares backends in
+        self.auto_plan_tokens = auto_plan_tokens
+        self.latency = LatencyTracker()
+        self._lock = threading.Lock()
+        self._cleanups = set()  # keeps abandoned async requests alive until they are closed
+
+    def register(self, backend: Type[ChatBackend]) -> None:
+        self.backends[backend.model_choice] = backend
+        self.loads[backend.name] = BackendLoad(backend.max_concurrency, backend.expected_tokens_per_second)
+
+    def get(self, model_choice: str) -> Type[ChatBackend]:
+        backend = self.backends.get(model_choice)
+        if backend is None:
+            raise ValueError(f"Unknown model: {model_choice} (available: {', '.join(self.backends)})")
+        return backend
+
+    @contextmanager
+    def plan(self, model_choice: str):
+        """Count a plan against its backend while it runs; "auto" is resolved to a backend here."""
+        with self._lock:
+            backend = self.choose() if model_choice == self.AUTO else self.get(model_choice)
+            load = self.loads[backend.name]
+            load.in_flight += 1
+        try:
+            yield backend
+        finally:
+            with self._lock:
+                load.in_flight -= 1
+
+    def choose(self) -> Type[ChatBackend]:
+        # Backends under their concurrency cap come first, then the shortest expected plan time
+        ranking = {}
+        for backend in self.backends.values():
+            load = self.loads[backend.name]
+            throttle = scheduler.get_provider(backend.name).expected_wait(self.auto_plan_tokens)
+            ranking[backend] = (
+                load.in_flight >= load.max_concurrency,
+                throttle + load.estimate_seconds(self.auto_plan_tokens),
+                throttle,
+            )
+        chosen = min(ranking, key=lambda backend: ranking[backend][:2])
+
+        AUTO_ROUTES.inc(backend=chosen.name)
+        logger.info(f"auto model routed to {chosen.model_choice}: " + "; ".join(
+            f"{backend.model_choice} ~{estimate:.1f}s ({self.loads[backend.name].describe()}, "
+            f"rate-limit wait {throttle:.1f}s{', at capacity' if full else ''})"
+            for backend, (full, estimate, throttle) in ranking.items()
+        ))
+        return chosen
+
+    def backup_for(self, backend: Type[ChatBackend]) -> Optional[Type[ChatBackend]]:
+        if not self.hedge:
+            return None
+        return next((other for other in self.backends.values() if other is not backend), None)
+
+    def deadline(self, backend: Type[ChatBackend], kind: str) -> float:
+        if self.latency.count(backend.name, kind) < self.min_samples:
+            return self.default_deadline
+        return max(self.min_deadline, self.latency.percentile(backend.name, kind, self.hedge_percentile))
+
+    def complete(self, model_choice: str, prepare: Callable) -> Optional[object]:
+        """The assistant message for one non-streamed round.
+
+        `prepare(backend)` returns the (messages, tools) to send to that backend. A round that may be
+        hedged is streamed instead: a plain request that lost could only be dropped once its whole
+        reply had been generated.
+        """
+        if self.backup_for(self.get(model_choice)) is not None:
+            events = deque(self.stream(model_choice, prepare), maxlen=1)
+            return events[0] if events else None
+
+        def start(backend):
+            messages, tools = prepare(backend)
+            return lambda: self._tracked_call(backend, lambda: backend.complete(messages, tools)), None, None
+
+        _, message = self._race(self.get(model_choice), "complete", start)
+        return message
+
+    def stream(self, model_choice: str, prepare: Callable) -> Iterator:
+        """The events of one streamed round (text deltas, then the assistant message)."""
+        streams = {}
+        primary = self.get(model_choice)
+        # Only a request that may lose a hedge is ever cut off
+        hedged = self.backup_for(primary) is not None
+
+        def start(backend):
+            messages, tools = prepare(backend)
+            cancellation = Cancellation() if hedged else None
+            stream = streams[backend] = self._tracked_stream(
+                backend, backend.stream(messages, tools, cancellation), cancellation
+            )
+            return lambda: next(stream, None), cancellation, stream.close
+
+        backend, first = self._race(primary, "stream", start)
+        if first is None:
+            return
+        yield first
+        yield from streams[backend]
+
+    async def acomplete(self, model_choice: str, prepare: Callable) -> Optional[object]:
+        def start(backend):
+            messages, tools = prepare(backend)
+            return self._atracked_call(backend, backend.acomplete(messages, tools)), None
+
+        _, message = await self._arace(self.get(model_choice), "complete", start)
+        return message
+
+    async def astream(self, model_choice: str, prepare: Callable) -> AsyncIterator:
+        streams = {}
+
+        def start(backend):
+            messages, tools = prepare(backend)
+            stream = streams[backend] = self._atracked_stream(backend, backend.astream(messages, tools))
+            return self._afirst(stream), stream.aclose
+
+        backend, first = await self._arace(self.get(model_choice), "stream", start)
+        if first is None:
+            return
+        yield first
+        async for event in streams[backend]:
+            yield event
+
+    def _record_round(self, backend: Type[ChatBackend], characters: int, started: float, failed: bool) -> None:
+        # About four characters a token, as in the scheduler's estimates
+        with self._lock:
+            self.loads[backend.name].record_round(characters // 4, time.perf_counter() - started, failed)
+
+    def _tracked_call(self, backend: Type[ChatBackend], call: Callable):
+        started = time.perf_counter()
+        try:
+            message = call()
+        except Exception:
+            self._record_round(backend, 0, started, failed=True)
+            raise
+        self._record_round(backend, len(getattr(message, "content", None) or ""), started, failed=False)
+        return message
+
+    def _tracked_stream(self, backend: Type[ChatBackend], stream: Iterator,
+                        cancellation: Optional[Cancellation] = None) -> Iterator:
+        started = time.perf_counter()
+        characters = 0
+        try:
+            for event in stream:
+                if isinstance(event, str):
+                    characters += len(event)
+                yield event
+        except Exception:
+            # A hedge that lost and was cut off has not failed
+            if cancellation is None or not cancellation.cancelled:
+                self._record_round(backend, characters, started, failed=True)
+            raise
+        finally:
+            stream.close()
+        # A stream closed early (a hedge that lost, a client that left) is not recorded at all
+        self._record_round(backend, characters, started, failed=False)
+
+    async def _atracked_call(self, backend: Type[ChatBackend], call):
+        started = time.perf_counter()
+        try:
+            message = await call
+        except Exception:
+            self._record_round(backend, 0, started, failed=True)
+            raise
+        self._record_round(backend, len(getattr(message, "content", None) or ""), started, failed=False)
+        return message
+
+    async def _atracked_stream(self, backend: Type[ChatBackend], stream: AsyncIterator) -> AsyncIterator:
+        started = time.perf_counter()
+        characters = 0
+        try:
+            async for event in stream:
+                if isinstance(event, str):
+                    characters += len(event)
+                yield event
+        except Exception:
+            self._record_round(backend, characters, started, failed=True)
+            raise
+        finally:
+            await stream.aclose()
+        self._record_round(backend, characters, started, failed=False)
+
+    @staticmethod
+    async def _afirst(stream: AsyncIterator):
+        async for event in stream:
+            return event
+        return None
+
+    def _race(self, primary: Type[ChatBackend], kind: str, start: Callable) -> tuple:
+        """Run `start(backend)`'s call for the primary (and maybe the backup) and return the first success.
+
+        `start` returns the call to make, the `Cancellation` its requests are watched by and a
+        function that closes it once it has returned; the last two are used if it loses.
+        """
+        backup = self.backup_for(primary)
+        if backup is None:
+            call, _, _ = start(primary)
+            started = time.perf_counter()
+            result = call()
+            self.latency.observe(primary.name, kind, time.perf_counter() - started)
+            return primary, result
+
+        pending = {}   # future -> (backend, started, cancellation, close)
+        errors = []
+
+        def launch(backend):
+            call, cancellation, close = start(backend)
+            pending[_hedge_executor.submit(call)] = (backend, time.perf_counter(), cancellation, close)
+
+        launch(primary)
+        try:
+            deadline = self.deadline(primary, kind)
+            done, _ = wait(pending, timeout=deadline)
+            hedged = not done
+            if hedged:
+                logger.warning(f"{primary.name} missed its {deadline:.1f}s {kind} deadline, hedging with {backup.name}")
+                launch(backup)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    backend, started, _, _ = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors.append(e)
+                        if backend is primary and not hedged:
+                            self._log_failover(primary, backup, e)
+                            launch(backup)
+                        continue
+                    self.latency.observe(backend.name, kind, time.perf_counter() - started)
+                    if hedged:
+                        LLM_HEDGES.inc(primary=primary.name, backup=backup.name, winner=backend.name)
+                    return backend, result
+            raise errors[0]
+        finally:
+            for future, (backend, _, cancellation, close) in pending.items():
+                self._abandon(future, cancellation, close)
+
+    @staticmethod
+    def _log_failover(primary: Type[ChatBackend], backup: Type[ChatBackend], error: Exception) -> None:
+        logger.warning(f"{primary.name} failed ({error}), failing over to {backup.name}")
+        LLM_FAILOVERS.inc(primary=primary.name, backup=backup.name)
+
+    @staticmethod
+    def _abandon(future, cancellation: Optional[Cancellation], close: Optional[Callable]) -> None:
+        # Shutting the connection down makes a read blocked in the request's thread fail now; the
+        # request is closed once that thread returns, and its result is dropped
+        if future.cancel():
+            return
+        if cancellation is not None:
+            cancellation.cancel()
+        if close is not None:
+            future.add_done_callback(lambda _: close())
+
+    async def _arace(self, primary: Type[ChatBackend], kind: str, start: Callable) -> tuple:
+        backup = self.backup_for(primary)
+        if backup is None:
+            call, _ = start(primary)
+            started = time.perf_counter()
+            result = await call
+            self.latency.observe(primary.name, kind, time.perf_counter() - started)
+            return primary, result
+
+        pending = {}   # task -> (backend, started, close)
+        errors = []
+
+        def launch(backend):
+            call, close = start(backend)
+            pending[asyncio.ensure_future(call)] = (backend, time.perf_counter(), close)
+
+        launch(primary)
+        try:
+            deadline = self.deadline(primary, kind)
+            done, _ = await asyncio.wait(pending, timeout=deadline)
+            hedged = not done
+            if hedged:
+                logger.warning(f"{primary.name} missed its {deadline:.1f}s {kind} deadline, hedging with {backup.name}")
+                launch(backup)
+
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    backend, started, close = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        errors.append(e)
+                        if backend is primary and not hedged:
+                            self._log_failover(primary, backup, e)
+                            launch(backup)
+                        continue
+                    self.latency.observe(backend.name, kind, time.perf_counter() - started)
+                    if hedged:
+                        LLM_HEDGES.inc(primary=primary.name, backup=backup.name, winner=backend.name)
+                    return backend, result
+            raise errors[0]
+        finally:
+            # Also reached when the caller itself is cancelled mid-race
+            for task, (backend, _, close) in pending.items():
+                task.cancel()
+                cleanup = asyncio.ensure_future(self._aclose(task, close))
+                self._cleanups.add(cleanup)
+                cleanup.add_done_callback(self._cleanups.discard)
+
+    @staticmethod
+    async def _aclose(task: asyncio.Task, close: Optional[Callable]) -> None:
+        await asyncio.gather(task, return_exceptions=True)
+        if close is not None:
+            await close()
+
+
+llm_router = LLMRouter(
+    [OpenAIModel, Ollama],
+    hedge=os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes"),
+    hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+    min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+    default_deadline=float(os.getenv("LLM_HEDGE_DEFAULT_SECONDS", "15")),
+    min_deadline=float(os.getenv("LLM_HEDGE_MIN_SECONDS", "1")),
+    auto_plan_tokens=int(os.getenv("LLM_AUTO_PLAN_TOKENS", "1500")),
+)
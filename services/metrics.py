@@ -0,0 +1,243 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: dict = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    for name, value in (extra or {}).items():
+        pairs.append(f'{name}="{_escape(value)}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, description: str, label_names: tuple = ()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(name, "") for name in self.label_names), 0.0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _format_labels(self.label_names, key, {"le": bound})
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, key, {"le": "+Inf"})
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, description: str, label_names: tuple = ()) -> Counter:
+        metric = Counter(name, description, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, description: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, description, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "travel_planner_stage_seconds", "Duration of each planning stage.", ("stage", "model")
+)
+TIME_TO_FIRST_TOKEN_SECONDS = registry.histogram(
+    "travel_planner_time_to_first_token_seconds", "Time from request start to the first streamed token.", ("model",)
+)
+STAGE_ERRORS = registry.counter(
+    "travel_planner_stage_errors_total", "Planning stages that raised an error.", ("stage", "model")
+)
+TOKENS = registry.counter(
+    "travel_planner_tokens_total",
+    "LLM tokens consumed: prompt, completion, and the part of the prompt served from the provider's prompt cache.",
+    ("backend", "kind")
+)
+PREFILL_SECONDS = registry.histogram(
+    "travel_planner_prefill_seconds", "Time the model spent evaluating the prompt (reported by Ollama).", ("backend",)
+)
+TOKENS_PER_SECOND = registry.histogram(
+    "travel_planner_tokens_per_second", "Completion tokens generated per second.", ("backend",),
+    buckets=(5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+)
+CACHE_REQUESTS = registry.counter(
+    "travel_planner_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result")
+)
+OUTBOUND_RETRIES = registry.counter(
+    "travel_planner_outbound_retries_total", "Upstream API calls retried after a 429, 5xx or transport error.", ("provider",)
+)
+OUTBOUND_COALESCED = registry.counter(
+    "travel_planner_outbound_coalesced_total", "Upstream calls answered by an identical request already in flight.", ("provider",)
+)
+OUTBOUND_THROTTLE_SECONDS = registry.histogram(
+    "travel_planner_outbound_throttle_seconds", "Time spent waiting for a provider's rate limit.", ("provider",)
+)
+LLM_HEDGES = registry.counter(
+    "travel_planner_llm_hedges_total",
+    "Model rounds also sent to a backup backend after the primary missed its latency deadline, by winner.",
+    ("primary", "backup", "winner")
+)
+AUTO_ROUTES = registry.counter(
+    "travel_planner_auto_routes_total", "Plans with the auto model, by the backend they were routed to.", ("backend",)
+)
+LLM_FAILOVERS = registry.counter(
+    "travel_planner_llm_failovers_total", "Model rounds moved to a backup backend after the primary failed.",
+    ("primary", "backup")
+)
+PLANS_SUPERSEDED = registry.counter(
+    "travel_planner_plans_superseded_total", "Web UI plans cancelled because their session submitted a new one."
+)
+QUEUE_WAIT_SECONDS = registry.histogram(
+    "travel_planner_queue_wait_seconds", "Time web UI plans waited for a slot under the global plan limit."
+)
+
+
+@contextmanager
+def span(stage: str, model: str = ""):
+    """Time a planning stage into the stage histogram and the log."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        # A stream abandoned by its consumer (GeneratorExit) is not counted as a failure
+        STAGE_ERRORS.inc(stage=stage, model=model)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage, model=model)
+        logger.info("stage=%s model=%s duration_ms=%.1f", stage, model, elapsed * 1000)
+
+
+def record_usage(backend: str, prompt_tokens: int, completion_tokens: int, generation_seconds: float = None,
+                 cached_prompt_tokens: int = None) -> None:
+    TOKENS.inc(prompt_tokens or 0, backend=backend, kind="prompt")
+    TOKENS.inc(completion_tokens or 0, backend=backend, kind="completion")
+    message = f"backend={backend} prompt_tokens={prompt_tokens} completion_tokens={completion_tokens}"
+    if cached_prompt_tokens is not None:
+        TOKENS.inc(cached_prompt_tokens, backend=backend, kind="cached_prompt")
+        hit_rate = cached_prompt_tokens / prompt_tokens if prompt_tokens else 0.0
+        message += f" cached_prompt_tokens={cached_prompt_tokens} prompt_cache_hit={hit_rate:.0%}"
+    if completion_tokens and generation_seconds:
+        tokens_per_second = completion_tokens / generation_seconds
+        TOKENS_PER_SECOND.observe(tokens_per_second, backend=backend)
+        message += f" tokens_per_second={tokens_per_second:.1f}"
+    logger.info(message)
+
+
+def record_openai_usage(usage, generation_seconds: float = None) -> None:
+    if usage is None:
+        return
+    # Prompts sharing a prefix of 1024+ tokens with a recent request are partly served from cache;
+    # the planner's shared prefix is shorter than that, so this stays 0 for its requests
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or 0
+    record_usage("openai", usage.prompt_tokens, usage.completion_tokens, generation_seconds, cached_tokens)
+
+
+def record_ollama_usage(response: dict) -> None:
+    # Ollama reports durations in nanoseconds on the final (done) message. A prompt whose prefix is
+    # still in the loaded model's context is only partly re-evaluated, which shows up as a short prefill.
+    eval_duration = response.get("eval_duration")
+    prompt_eval_duration = response.get("prompt_eval_duration")
+    if prompt_eval_duration:
+        PREFILL_SECONDS.observe(prompt_eval_duration / 1e9, backend="ollama")
+    record_usage(
+        "ollama",
+        response.get("prompt_eval_count", 0),
+        response.get("eval_count", 0),
+        eval_duration / 1e9 if eval_duration else None
+    )
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        # Metrics are optional; a taken port must not keep the app from starting
+        logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Serving Prometheus metrics on http://%s:%s/metrics", host, port)
+    return server
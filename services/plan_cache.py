@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import load_config
+from schemas.trip_details import TripDetails
+from services.metrics import CACHE_REQUESTS
+
+load_config()
+
+
+class PlanCache:
+    """Completed travel plans in a memory LRU tier backed by a SQLite tier, both with a TTL."""
+
+    def __init__(self, path: str, ttl_seconds: float, memory_size: int, enabled: bool = True):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_size = memory_size
+        self.enabled = enabled
+        self._memory = OrderedDict()  # key -> (expires_at, plan)
+        self._lock = threading.Lock()
+        self._connection = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    @staticmethod
+    def normalize_trip(trip_details: TripDetails) -> dict:
+        def clean(value) -> str:
+            return " ".join(str(value).split()).casefold()
+
+        return {
+            "destination": clean(trip_details.destination),
+            "travel_from": clean(trip_details.travel_from),
+            "travel_to": clean(trip_details.travel_to),
+            "travel_experience": clean(trip_details.travel_experience),
+            "spend_level": clean(trip_details.spend_level),
+            "model": clean(trip_details.model),
+        }
+
+    @staticmethod
+    def make_key(normalized_trip: dict, prompt_version: str) -> str:
+        payload = json.dumps({"trip": normalized_trip, "prompt": prompt_version}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] >= now:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                CACHE_REQUESTS.inc(cache="plan", result="memory_hit")
+                return entry[1]
+            self._memory.pop(key, None)
+
+            row = self._get_connection().execute(
+                "SELECT plan, created_at FROM plans WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] + self.ttl_seconds >= now:
+                self._remember(key, row[0], row[1] + self.ttl_seconds)
+                self.stats["disk_hits"] += 1
+                CACHE_REQUESTS.inc(cache="plan", result="disk_hit")
+                return row[0]
+
+            self.stats["misses"] += 1
+            CACHE_REQUESTS.inc(cache="plan", result="miss")
+            return None
+
+    def set(self, key: str, plan: str) -> None:
+        if not self.enabled:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._remember(key, plan, now + self.ttl_seconds)
+            connection = self._get_connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO plans (key, plan, created_at) VALUES (?, ?, ?)",
+                    (key, plan, now)
+                )
+                connection.execute("DELETE FROM plans WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.stats["stores"] += 1
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            connection = self._get_connection()
+            with connection:
+                connection.execute("DELETE FROM plans")
+
+    def _remember(self, key: str, plan: str, expires_at: float) -> None:
+        self._memory[key] = (expires_at, plan)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _get_connection(self) -> sqlite3.Connection:
+        # Callers hold self._lock, so a single connection can be shared between threads
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, plan TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._connection.execute("CREATE INDEX IF NOT EXISTS plans_created_at ON plans (created_at)")
+        return self._connection
+
+
+plan_cache = PlanCache(
+    path=os.getenv("PLAN_CACHE_PATH", os.path.join(".cache", "plans.sqlite3")),
+    ttl_seconds=float(os.getenv("PLAN_CACHE_TTL", "21600")),
+    memory_size=int(os.getenv("PLAN_CACHE_MEMORY_SIZE", "256")),
+    enabled=os.getenv("PLAN_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+)
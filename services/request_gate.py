@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Callable, Optional
+
+from services.metrics import PLANS_SUPERSEDED, QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class RequestGate:
+    """Admission for the web UI's plans: one plan per session and at most `max_running` overall.
+
+    A new plan from a session cancels the one the session still has running or queued; the
+    cancellation reaches the model call that is in progress and closes its HTTP stream, so an
+    abandoned plan stops costing tokens. Plans over the global limit wait in FIFO order, and the
+    waiting message is updated whenever their place in the queue changes.
+    """
+
+    def __init__(self, max_running: int, waiting_message: Callable[[int], str]):
+        self.max_running = max_running
+        self.waiting_message = waiting_message
+        self._running = 0
+        self._waiting = deque()  # one future per queued plan, resolved when it gets a slot
+        self._queue_changed = None  # future resolved (and replaced) whenever the queue moves
+        self._sessions = {}  # session id -> task of the session's current plan
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def _notify(self) -> None:
+        if self._queue_changed is not None and not self._queue_changed.done():
+            self._queue_changed.set_result(None)
+        self._queue_changed = None
+
+    def _changed(self) -> asyncio.Future:
+        if self._queue_changed is None:
+            self._queue_changed = asyncio.get_running_loop().create_future()
+        return self._queue_changed
+
+    def _release(self) -> None:
+        while self._waiting:
+            admitted = self._waiting.popleft()
+            if not admitted.done():
+                admitted.set_result(None)
+                break
+        else:
+            self._running -= 1
+        self._notify()
+
+    async def _acquire(self, updates: asyncio.Queue) -> None:
+        if self.max_running <= 0 or (self._running < self.max_running and not self._waiting):
+            self._running += 1
+            return
+
+        admitted = asyncio.get_running_loop().create_future()
+        self._waiting.append(admitted)
+        started = asyncio.get_running_loop().time()
+        try:
+            while not admitted.done():
+                updates.put_nowait(self.waiting_message(self._waiting.index(admitted) + 1))
+                await asyncio.wait({admitted, self._changed()}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            if admitted.done():
+                self._release()  # the slot was handed over just as the plan was cancelled
+            else:
+                admitted.cancel()
+                self._waiting.remove(admitted)
+                self._notify()
+            raise
+        QUEUE_WAIT_SECONDS.observe(asyncio.get_running_loop().time() - started)
+
+    async def run(self, session_id: Optional[str], plan: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Stream `plan` once it is admitted, replacing the session's previous plan.
+
+        While the plan is queued, waiting messages are yielded. A plan replaced by a newer one from
+        its session ends without further output.
+        """
+        updates = asyncio.Queue()
+        done = object()
+
+        async def pump() -> None:
+            try:
+                await self._acquire(updates)
+                try:
+                    async for chunk in plan:
+                        updates.put_nowait(chunk)
+                finally:
+                    self._release()
+            except Exception as e:
+                updates.put_nowait(e)
+            finally:
+                updates.put_nowait(done)
+
+        previous = self._sessions.get(session_id) if session_id else None
+        if previous is not None and not previous.done():
+            previous.cancel()
+            PLANS_SUPERSEDED.inc()
+            logger.info(f"Session {session_id} submitted a new plan; cancelled the previous one")
+
+        task = asyncio.ensure_future(pump())
+        if session_id:
+            self._sessions[session_id] = task
+        try:
+            while True:
+                item = await updates.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            task.cancel()
+            if session_id and self._sessions.get(session_id) is task:
+                del self._sessions[session_id]
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+import httpx
+import requests
+
+from config import load_config
+from services.metrics import OUTBOUND_COALESCED, OUTBOUND_RETRIES, OUTBOUND_THROTTLE_SECONDS
+
+load_config()
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Refills `per_minute` tokens a minute up to one minute's worth; callers reserve and then sleep.
+
+    Reserving under the lock and sleeping outside it lets threads and coroutines share one bucket:
+    each caller is handed its own slot in the queue instead of racing for the next refill.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self._tokens = per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens and return how many seconds to wait before using them."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def peek(self, amount: float = 1.0) -> float:
+        """How long a reservation of `amount` made now would wait, without taking anything."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            tokens = min(self.capacity, self._tokens + (time.monotonic() - self._updated) * self.rate)
+        return 0.0 if tokens >= amount else (amount - tokens) / self.rate
+
+
+class Provider:
+    """Limits and retry policy for one upstream API."""
+
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_retries: int = 4, backoff_base: float = 0.5, backoff_max: float = 20.0):
+        self.name = name
+        # 0 disables a limit (e.g. a local Ollama server)
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def reserve(self, tokens: int = 0) -> float:
+        wait = self.requests.reserve() if self.requests else 0.0
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def expected_wait(self, tokens: int = 0) -> float:
+        wait = self.requests.peek() if self.requests else 0.0
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.peek(tokens))
+        return wait
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # Full jitter keeps clients that failed together from retrying together
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable_owm_error(error: Exception) -> bool:
+    """pyowm replaces HTTP errors with its own exceptions, which carry no status code."""
+    exceptions = sys.modules.get("pyowm.commons.exceptions")
+    if exceptions is None:
+        return False
+    if isinstance(error, (exceptions.TimeoutError, exceptions.InvalidSSLCertificateError, exceptions.BadGatewayError)):
+        # InvalidSSLCertificateError is also what pyowm raises for a refused or dropped connection
+        return True
+    if not isinstance(error, exceptions.APIRequestError):
+        return False
+    # Raised for 400, 429 and most 5xx; only the response body is kept, and OWM puts the status
+    # in its "cod" field. A body that is not OWM's JSON comes from a proxy or gateway failing
+    try:
+        status = int(json.loads(str(error))["cod"])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return status == 429 or status >= 500
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (httpx.TransportError, requests.ConnectionError, requests.Timeout)):
+        return True
+    # openai is imported lazily; if it is not loaded yet, none of its errors can be in flight
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(error, openai.APIConnectionError):
+        return True
+    if is_retryable_owm_error(error):
+        return True
+    status = get_status_code(error)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class OutboundScheduler:
+    """Every call to an external API goes through here: rate limits, retries and coalescing.
+
+    `call`/`acall` wait for the provider's request (and, for LLMs, token) budget, retry 429s,
+    5xx and transport errors with jittered exponential backoff (or the server's Retry-After),
+    and, when given a `key`, let concurrent identical calls share a single in-flight request.
+    A `timeout` bounds the whole synchronous call: a rate-limit wait or retry that would end after
+    it raises TimeoutError instead, so a caller that has given up does not leave a thread behind.
+    """
+
+    def __init__(self, providers: dict):
+        self.providers = providers
+        self._lock = threading.Lock()
+        self._in_flight = {}        # key -> Future shared by threads
+        self._async_in_flight = {}  # key -> Task shared by coroutines
+
+    def get_provider(self, name: str) -> Provider:
+        provider = self.providers.get(name)
+        if provider is None:
+            provider = self.providers.setdefault(name, Provider(name))
+        return provider
+
+    def call(self, provider_name: str, func: Callable, tokens: int = 0, key: str = None,
+             timeout: Optional[float] = None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        if key is None:
+            return self._call(self.get_provider(provider_name), func, tokens, deadline)
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        if not owner:
+            OUTBOUND_COALESCED.inc(provider=provider_name)
+            return future.result(timeout=timeout)
+
+        try:
+            future.set_result(self._call(self.get_provider(provider_name), func, tokens, deadline))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+        return future.result()
+
+    async def acall(self, provider_name: str, func: Callable[[], Awaitable], tokens: int = 0, key: str = None):
+        if key is None:
+            return await self._acall(self.get_provider(provider_name), func, tokens)
+
+        task = self._async_in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._acall(self.get_provider(provider_name), func, tokens))
+            self._async_in_flight[key] = task
+            task.add_done_callback(lambda _: self._async_in_flight.pop(key, None))
+        else:
+            OUTBOUND_COALESCED.inc(provider=provider_name)
+        # Shielded so that one cancelled caller does not cancel the request for everyone else
+        return await asyncio.shield(task)
+
+    def _call(self, provider: Provider, func: Callable, tokens: int, deadline: Optional[float] = None):
+        attempt = 0
+        while True:
+            # Checked before reserving, so a call that gives up does not hold a slot of the budget
+            if deadline is not None and time.monotonic() + provider.expected_wait(tokens) > deadline:
+                raise TimeoutError(f"{provider.name} rate limit would delay the request past its timeout")
+            wait = provider.reserve(tokens)
+            if wait:
+                OUTBOUND_THROTTLE_SECONDS.observe(wait, provider=provider.name)
+                time.sleep(wait)
+            try:
+                return func()
+            except Exception as e:
+                if attempt >= provider.max_retries or not is_retryable(e):
+                    raise
+                delay = provider.backoff(attempt, e)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+            attempt += 1
+            self._log_retry(provider, attempt, delay)
+            time.sleep(delay)
+
+    async def _acall(self, provider: Provider, func: Callable[[], Awaitable], tokens: int):
+        attempt = 0
+        while True:
+            wait = provider.reserve(tokens)
+            if wait:
+                OUTBOUND_THROTTLE_SECONDS.observe(wait, provider=provider.name)
+                await asyncio.sleep(wait)
+            try:
+                return await func()
+            except Exception as e:
+                if attempt >= provider.max_retries or not is_retryable(e):
+                    raise
+                delay = provider.backoff(attempt, e)
+            attempt += 1
+            self._log_retry(provider, attempt, delay)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _log_retry(provider: Provider, attempt: int, delay: float) -> None:
+        OUTBOUND_RETRIES.inc(provider=provider.name)
+        logger.warning(f"{provider.name} request failed, retry {attempt}/{provider.max_retries} in {delay:.1f}s")
+
+
+def estimate_tokens(messages: list, max_tokens: int = 0) -> int:
+    """Rough prompt size (4 characters a token) plus the completion budget, for token-per-minute limits."""
+    characters = sum(len(str(message.get("content") or "")) for message in messages)
+    return characters // 4 + max_tokens
+
+
+def _provider(name: str, prefix: str, requests_per_minute: str, tokens_per_minute: str = "0") -> Provider:
+    return Provider(
+        name,
+        requests_per_minute=float(os.getenv(f"{prefix}_RPM", requests_per_minute)),
+        tokens_per_minute=float(os.getenv(f"{prefix}_TPM", tokens_per_minute)),
+        max_retries=int(os.getenv("OUTBOUND_MAX_RETRIES", "4")),
+        backoff_base=float(os.getenv("OUTBOUND_BACKOFF_BASE", "0.5")),
+        backoff_max=float(os.getenv("OUTBOUND_BACKOFF_MAX", "20")),
+    )
+
+
+scheduler = OutboundScheduler({
+    "openai": _provider("openai", "OPENAI", "500", "200000"),
+    "ollama": _provider("ollama", "OLLAMA", "0"),
+    "owm": _provider("owm", "OWM", "60"),
+    "exchange_rates": _provider("exchange_rates", "EXCHANGE_RATES", "60"),
+})
@@ -0,0 +1,51 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import load_config
+
+load_config()
+
+
+class PlanSessionStore:
+    """The last sectioned plan of each UI session, so that an edited trip can be re-planned incrementally.
+
+    A snapshot holds the normalized trip inputs, the forecast the plan was written with and every
+    section's instruction and text. Sessions are kept in memory, least recently used first out.
+    """
+
+    def __init__(self, ttl_seconds: float, max_sessions: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session id -> (expires_at, snapshot)
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return entry[1]
+
+    def put(self, session_id: str, snapshot: dict) -> None:
+        with self._lock:
+            self._sessions[session_id] = (time.time() + self.ttl_seconds, snapshot)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+
+
+plan_sessions = PlanSessionStore(
+    ttl_seconds=float(os.getenv("PLAN_SESSION_TTL", "3600")),
+    max_sessions=int(os.getenv("PLAN_SESSION_SIZE", "1000"))
+)
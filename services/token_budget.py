@@ -0,0 +1,110 @@
+import json
+import logging
+import math
+import os
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+TRUNCATION_MARKER = " …[truncated]"
+
+
+def compact_json(value) -> str:
+    """JSON for the model: no whitespace and no nulls. Values are kept exact; tools round their own."""
+    def compact(item):
+        if isinstance(item, dict):
+            return {key: compact(val) for key, val in item.items() if val is not None}
+        if isinstance(item, list):
+            return [compact(val) for val in item]
+        return item
+
+    return json.dumps(compact(value), separators=(",", ":"), ensure_ascii=False)
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    # tiktoken is optional; without it OpenAI prompts are estimated like Ollama ones
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")  # gpt-4o family
+    except Exception:
+        # The encoding is downloaded on first use, which fails offline
+        return None
+
+
+class TokenBudget:
+    """Counts prompt tokens for one backend and trims a message list to that backend's budget.
+
+    OpenAI prompts are counted with tiktoken when it is installed; otherwise, and for Ollama,
+    a characters-per-token estimate is used. When the prompt is over budget, tool results are
+    truncated first (largest first), then assistant and user turns; the system prompt is kept.
+    """
+    # Rough characters per token when no tokenizer is available; Llama tokenizers are less dense
+    CHARS_PER_TOKEN = {"openai": 4.0, "ollama": 3.2}
+    MESSAGE_OVERHEAD = 4  # role and separator tokens around every message
+    MIN_KEEP_TOKENS = 64
+    TRIM_ORDER = ("tool", "assistant", "user")
+
+    def __init__(self, backend: str, max_prompt_tokens: int):
+        self.backend = backend
+        self.max_prompt_tokens = max_prompt_tokens
+        self._encoding = _get_encoding() if backend == "openai" else None
+
+    @classmethod
+    def for_model(cls, model_choice: str) -> "TokenBudget":
+        if model_choice == "llama2":
+            # Llama 2 has a 4k context; the rest is left for the answer
+            return cls("ollama", int(os.getenv("OLLAMA_PROMPT_BUDGET", "2500")))
+        return cls("openai", int(os.getenv("OPENAI_PROMPT_BUDGET", "8000")))
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return math.ceil(len(text) / self.CHARS_PER_TOKEN[self.backend])
+
+    def count_messages(self, messages: list, tools: list = None) -> int:
+        total = 0
+        for message in messages:
+            total += self.MESSAGE_OVERHEAD + self.count(message.get("content") or "")
+            for tool_call in message.get("tool_calls") or []:
+                total += self.count(tool_call["function"]["name"]) + self.count(tool_call["function"]["arguments"])
+        if tools:
+            total += self.count(json.dumps(tools, separators=(",", ":")))
+        return total
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.count(text) <= max_tokens:
+            return text
+        max_tokens = max(0, max_tokens - self.count(TRUNCATION_MARKER))
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text)[:max_tokens]) + TRUNCATION_MARKER
+        return text[:int(max_tokens * self.CHARS_PER_TOKEN[self.backend])] + TRUNCATION_MARKER
+
+    def fit(self, messages: list, tools: list = None) -> int:
+        """Trim `messages` in place to the budget and return the resulting prompt size in tokens."""
+        total = self.count_messages(messages, tools)
+        excess = total - self.max_prompt_tokens
+        if excess <= 0:
+            return total
+
+        candidates = [m for m in messages if m.get("role") in self.TRIM_ORDER and m.get("content")]
+        candidates.sort(key=lambda m: (self.TRIM_ORDER.index(m["role"]), -len(m["content"])))
+        for message in candidates:
+            tokens = self.count(message["content"])
+            cut = min(excess, tokens - self.MIN_KEEP_TOKENS)
+            if cut <= 0:
+                continue
+            message["content"] = self.truncate(message["content"], tokens - cut)
+            excess -= cut
+            if excess <= 0:
+                break
+
+        trimmed = self.count_messages(messages, tools)
+        logger.warning(f"Prompt over the {self.backend} budget of {self.max_prompt_tokens} tokens: "
+                       f"trimmed from {total} to {trimmed}")
+        return trimmed
@@ -1,35 +1,122 @@
-from models.open_ai import OpenAIModel
-from models.ollama import Ollama
+from services.artifact_store import ArtifactStore
+from services.llm_router import llm_router
+from services.metrics import CACHE_REQUESTS, TIME_TO_FIRST_TOKEN_SECONDS, span
 from schemas.trip_details import TripDetails
+from services.plan_cache import plan_cache
+from services.session_store import plan_sessions
+from services.token_budget import TokenBudget, compact_json
+from tools.forecast_cache import forecast_cache
+from tools.currency import CurrencyConverterTool
+from tools.exchange_rates import exchange_rate_table
 from tools.image import ImageGenerator
 from tools.weather import WeatherTool
-import base64
-from io import BytesIO
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
 import json
-from typing import cast
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Iterator, cast
+
+logger = logging.getLogger(__name__)
+
+# Shared across planners so concurrent requests cannot spawn unbounded tool threads
+_tool_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TOOL_MAX_WORKERS", "8")),
+    thread_name_prefix="tool"
+)
+
+# Threads streaming the sections of sectioned plans; each plan keeps at most SECTION_CONCURRENCY busy
+_section_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SECTION_MAX_WORKERS", "16")),
+    thread_name_prefix="section"
+)
 
 
 class TravelPlanner:
-    def __init__(self, trip_details: TripDetails):
+    # The tools stop their own requests and retries at the same timeouts, so a worker whose tool
+    # timed out here is soon free again
+    TOOL_TIMEOUTS = {
+        "get_weather": forecast_cache.timeout,
+        "generate_image": ImageGenerator.TIMEOUT,
+        "convert_currency": exchange_rate_table.timeout,
+    }
+    DEFAULT_TOOL_TIMEOUT = 30.0
+
+    # Version of the static prompt prefix (system prompt and tool instructions); part of the plan cache key
+    PROMPT_VERSION = "2"
+
+    # Sections of a plan, in order, for sectioned generation: (key, heading, what the section covers)
+    PLAN_SECTIONS = (
+        ("overview", "Trip Overview", "season & weather expectations from the provided forecast"),
+        ("itinerary", "Day-by-day itinerary", "morning/afternoon/evening for every day"),
+        ("accommodations", "Accommodations", "options matched to the budget level"),
+        ("attractions", "Must-see attractions & activities", "short notes"),
+        ("cuisine", "Local cuisine", "dishes to try and where"),
+        ("transport", "Transportation", "getting around within the city"),
+        ("budget", "Budget breakdown", "approximate, in US dollars"),
+        ("packing", "Packing list", "tailored to season/activities"),
+        ("tips", "Important travel tips", "safety, etiquette, weather notes"),
+    )
+    # TripDetails fields each section is written from. When a trip is edited and re-planned in the
+    # same session, a section whose fields and instruction are unchanged is reused as it was
+    SECTION_INPUTS = {
+        "overview": ("destination", "travel_from", "travel_to", "travel_experience"),
+        # The itinerary's day range and dates are part of its instructions, split or not
+        "itinerary": ("destination", "travel_from", "travel_experience"),
+        "accommodations": ("destination", "travel_from", "travel_to", "spend_level"),
+        "attractions": ("destination", "travel_experience"),
+        "cuisine": ("destination",),
+        "transport": ("destination",),
+        "budget": ("destination", "travel_from", "travel_to", "travel_experience", "spend_level"),
+        "packing": ("destination", "travel_from", "travel_to", "travel_experience"),
+        "tips": ("destination", "travel_from", "travel_to"),
+    }
+    WEATHER_INPUTS = ("destination", "travel_from", "travel_to")
+    ITINERARY_DAYS_PER_SECTION = int(os.getenv("ITINERARY_DAYS_PER_SECTION", "3"))
+    SECTION_CONCURRENCY = int(os.getenv("SECTION_CONCURRENCY", "6"))
+
+    NO_RESPONSE_MESSAGE = "No response from the model. Please check the configuration."
+    NO_PLAN_MESSAGE = "No travel plan generated."
+
+    def __init__(self, trip_details: TripDetails, use_cache: bool = True, prefetch_weather: bool = None,
+                 sectioned: bool = None, session_id: str = None):
         self.trip_details = trip_details
+        self.use_cache = use_cache
+        if prefetch_weather is None:
+            prefetch_weather = os.getenv("PREFETCH_WEATHER", "false").lower() in ("1", "true", "yes")
+        self.prefetch_weather = prefetch_weather
+        # Generate the plan's sections as concurrent completions instead of one long one
+        if sectioned is None:
+            sectioned = os.getenv("SECTIONED_PLANS", "false").lower() in ("1", "true", "yes")
+        self.sectioned = sectioned
+        # Sectioned plans of one UI session are re-planned incrementally when the trip is edited
+        self.session_id = session_id
+        self._previous_plan = None
+        self.weather = None  # the forecast given to the model up front, if any
+        self._weather_prefetch = None
+        self._prefetched_weather = {}  # (normalized city, travel_from) -> tool content
+        self.artifacts = ArtifactStore()
+        self._token_budgets = {}  # model choice -> TokenBudget, one per backend a round is sent to
+        self.routed_model = None  # the backend's model once the plan has started ("auto" is resolved then)
 
     @staticmethod
     def get_system_prompt() -> str:
+        # Everything that is the same for every trip comes first and never varies byte-for-byte,
+        # so Ollama's loaded context can reuse it; bump PROMPT_VERSION whenever this text changes.
+        # OpenAI only caches prefixes of 1024+ tokens, and this one (with the tool schemas) is
+        # about 700, so OpenAI requests are not served from its prompt cache
         return (
             "You are a helpful travel planner. Provide accurate, concise, easy-to-understand recommendations.\n\n"
             "TOOLS AVAILABLE:\n"
             "1) Weather Tool – get forecast for the destination and trip dates.\n"
+            "2) Currency Tool – convert amounts between currencies; pass every budget line at once via 'amounts'.\n"
             "- Output in **Markdown** with clear headings, subheadings, bullets, and emojis where helpful.\n"
-            "- If unsure, say so."
-        )
-
-    def create_user_prompt(self) -> str:
-        return (
-            f"You are an expert AI travel planner. Create a visually rich **Markdown** travel plan for:\n\n"
-            f"- **Destination:** {self.trip_details.destination}\n"
-            f"- **Travel Dates:** {self.trip_details.travel_from} to {self.trip_details.travel_to}\n"
-            f"- **Experience Type:** {self.trip_details.travel_experience}\n"
-            f"- **Budget Level:** {self.trip_details.spend_level}\n\n"
+            "- If unsure, say so.\n\n"
+            "Create a visually rich **Markdown** travel plan for the trip described in the user message.\n\n"
             "### What to include\n"
             "1. **Trip Overview** (season & weather expectations from the provided forecast; do not include raw data URIs)\n"
             "2. **Day-by-day itinerary** (morning/afternoon/evening)\n"
@@ -39,8 +126,19 @@ class TravelPlanner:
             "6. **Transportation** within the city\n"
             "7. **Budget breakdown** (approximate, in US dollars)\n"
             "8. **Packing list** tailored to season/activities\n"
-            "9. **Important travel tips** (safety, etiquette, weather notes)\n\n"
+            "9. **Important travel tips** (safety, etiquette, weather notes)"
+        )
+
+    def create_user_prompt(self) -> str:
+        # Only the per-trip variables, after the shared prefix
+        return (
+            "Plan this trip:\n\n"
+            f"- **Destination:** {self.trip_details.destination}\n"
+            f"- **Travel Dates:** {self.trip_details.travel_from} to {self.trip_details.travel_to}\n"
+            f"- **Experience Type:** {self.trip_details.travel_experience}\n"
+            f"- **Budget Level:** {self.trip_details.spend_level}\n\n"
         )
+
     def get_message(self):
         system_prompt = self.get_system_prompt()
         user_prompt = self.create_user_prompt()
@@ -53,60 +151,150 @@ class TravelPlanner:
     def get_tools(self):
         return [
             {"type": "function", "function": WeatherTool.get_tool_description()},
+            {"type": "function", "function": CurrencyConverterTool.get_tool_description()},
         ]
 
+    def run_tool(self, tool_call) -> str:
+        tool_name = tool_call.function.name
+        tool_args = json.loads(tool_call.function.arguments)
+
+        if tool_name == "get_weather":
+            prefetched = self.get_prefetched_weather(tool_args)
+            if prefetched is not None:
+                return prefetched
+            weather_tool = WeatherTool(
+                destination_city=tool_args["destination_city"],
+                travel_from=tool_args["travel_from"],
+                travel_to=tool_args.get("travel_to")
+            )
+            weather = weather_tool.get_weather()
+            return compact_json(weather)
+        elif tool_name == "generate_image":
+            image_tool = ImageGenerator(
+                destination_city=tool_args["destination_city"],
+                trip_dates=tool_args["trip_dates"]
+            )
+            return self.image_tool_content(tool_args, image_tool.generate_image_bytes())
+        elif tool_name == "convert_currency":
+            currency_tool = CurrencyConverterTool(data=tool_args["data"])
+            return compact_json(currency_tool.convert_currency())
+
+        logger.warning(f"Unknown tool call: {tool_name}")
+        return compact_json({"error": f"Unknown tool: {tool_name}"})
+
+    def image_tool_content(self, tool_args: dict, image: bytes) -> str:
+        # The model only sees a handle; the PNG is spliced into the finished plan
+        city = tool_args["destination_city"]
+        handle = self.artifacts.put(image, "image/png", f"{city}, {tool_args['trip_dates']}")
+        return compact_json({
+            "image": handle,
+            "instructions": f"To show the image, write ![{city}]({handle}) where it fits in the plan."
+        })
+
+    def prepare_round(self, backend, messages: list, tools: list, offer_tools: bool) -> tuple:
+        """The conversation in `backend`'s format, trimmed to its prompt budget, and the tools to offer."""
+        prepared = backend.prepare_messages(messages, tools)
+        request_tools = tools if offer_tools else None
+        budget = self._token_budgets.get(backend.model_choice)
+        if budget is None:
+            budget = self._token_budgets[backend.model_choice] = TokenBudget.for_model(backend.model_choice)
+        # Backends without native tools get the schemas inside the system prompt, already in the messages
+        budget.fit(prepared, request_tools if backend.native_tools else None)
+        return prepared, request_tools
+
+    def get_model_choice(self) -> str:
+        return self.routed_model or getattr(self.trip_details, 'model', 'openai').lower()
+
+    def run_timed_tool(self, tool_call) -> str:
+        with span(f"tool:{tool_call.function.name}", self.get_model_choice()):
+            return self.run_tool(tool_call)
+
     def handle_tool(self, message):
-        response = []
         tool_calls = message.tool_calls
 
         if not tool_calls:
             return None
 
-        for tool_call in tool_calls:
+        # All calls from one assistant turn run side by side; each gets its own deadline
+        started = time.monotonic()
+        futures = [_tool_executor.submit(self.run_timed_tool, tool_call) for tool_call in tool_calls]
+
+        response = []
+        for tool_call, future in zip(tool_calls, futures):
             tool_name = tool_call.function.name
-            tool_args = json.loads(tool_call.function.arguments)
-
-            if tool_name == "get_weather":
-                weather_tool = WeatherTool(
-                    destination_city=tool_args["destination_city"],
-                    travel_from=tool_args["travel_from"]
-                )
-                weather = weather_tool.get_weather()
-                response.append({
-                    "role": "tool",
-                    "content": json.dumps(weather),
-                    "tool_call_id": tool_call.id,
-                })
-            elif tool_name == "generate_image":
-                image_tool = ImageGenerator(
-                    destination_city=tool_args["destination_city"],
-                    trip_dates=tool_args["trip_dates"]
-                )
-                image = image_tool.generate_image()
-                # Convert PIL image to base64 string
-                buffered = BytesIO()
-                image.save(buffered, format="PNG")
-                img_str = base64.b64encode(buffered.getvalue()).decode()
-                markdown_img = f"![{tool_args['destination_city']}]('data:image/png;base64,{img_str}')"
-                response.append({
-                    "role": "tool",
-                    "content": markdown_img,
-                    "tool_call_id": tool_call.id,
-                })
-            else:
-                print(f"Unknown tool call: {tool_name}")
+            timeout = self.TOOL_TIMEOUTS.get(tool_name, self.DEFAULT_TOOL_TIMEOUT)
+            try:
+                content = future.result(timeout=max(0.0, started + timeout - time.monotonic()))
+            except FutureTimeoutError:
+                future.cancel()
+                content = self.tool_timeout_content(tool_name, timeout)
+            except Exception as e:
+                content = self.tool_error_content(tool_name, e)
+
+            response.append(self.tool_message(tool_call, content))
 
         return response
 
-    def extract_content(self, resp):
-        if not resp:
-            return None
-        if isinstance(resp, dict):
-            if 'message' in resp and isinstance(resp['message'], dict):
-                return resp['message'].get('content')
-            if 'content' in resp:
-                return resp.get('content')
-        return None
+    @staticmethod
+    def weather_key(destination_city: str, travel_from: str) -> tuple:
+        return forecast_cache.normalize_location(destination_city), travel_from.strip()
+
+    def get_prefetched_weather(self, tool_args: dict):
+        key = self.weather_key(tool_args.get("destination_city", ""), tool_args.get("travel_from", ""))
+        prefetched = self._prefetched_weather.get(key)
+        if prefetched is not None:
+            logger.info(f"Answering get_weather for {tool_args['destination_city']} from the prefetched forecast")
+        return prefetched
+
+    def start_weather_prefetch(self, force: bool = False) -> None:
+        """Fetch the destination forecast in the background while the prompt is being built."""
+        if not (self.prefetch_weather or force):
+            return
+        weather_tool = WeatherTool(
+            self.trip_details.destination, self.trip_details.travel_from, self.trip_details.travel_to
+        )
+        self._weather_prefetch = _tool_executor.submit(weather_tool.get_weather)
+
+    def add_weather_context(self, messages: list) -> None:
+        if self._weather_prefetch is None:
+            return
+        future, self._weather_prefetch = self._weather_prefetch, None
+        try:
+            weather = future.result(timeout=self.TOOL_TIMEOUTS["get_weather"])
+        except Exception as e:
+            # Without the forecast the model can still ask for get_weather itself
+            logger.warning(f"Weather prefetch failed, falling back to the tool call: {e}")
+            return
+        self.inject_weather(messages, weather)
+
+    def inject_weather(self, messages: list, weather: dict) -> None:
+        self.weather = weather
+        content = compact_json(weather)
+        self._prefetched_weather[self.weather_key(self.trip_details.destination, self.trip_details.travel_from)] = content
+        messages[-1]["content"] += (
+            "### Weather forecast\n"
+            "Per-day forecast for the trip, already fetched with get_weather "
+            "(do not call get_weather again for this city and these dates):\n"
+            f"{content}\n"
+        )
+
+    @staticmethod
+    def tool_message(tool_call, content: str) -> dict:
+        return {
+            "role": "tool",
+            "content": content,
+            "tool_call_id": tool_call.id,
+        }
+
+    @staticmethod
+    def tool_timeout_content(tool_name: str, timeout: float) -> str:
+        logger.warning(f"Tool {tool_name} timed out after {timeout}s")
+        return compact_json({"error": f"{tool_name} timed out after {timeout} seconds"})
+
+    @staticmethod
+    def tool_error_content(tool_name: str, error: Exception) -> str:
+        logger.warning(f"Tool {tool_name} failed: {error}")
+        return compact_json({"error": f"{tool_name} failed: {error}"})
 
     @staticmethod
     def _ensure_text(value):
@@ -119,110 +307,352 @@ class TravelPlanner:
         except Exception:
             return str(value)
 
+    @staticmethod
+    def assistant_message(message) -> dict:
+        tool_calls_payload = None
+        if getattr(message, "tool_calls", None):
+            tool_calls_payload = []
+            for tc in message.tool_calls:
+                tool_calls_payload.append({
+                    "id": tc.id,
+                    "type": "function",
+                    "function": {
+                        "name": tc.function.name,
+                        "arguments": tc.function.arguments,
+                    }
+                })
+
+        return {
+            "role": "assistant",
+            "content": message.content or "",
+            **({"tool_calls": tool_calls_payload} if tool_calls_payload else {})
+        }
+
+    def get_cache_key(self) -> str:
+        normalized_trip = plan_cache.normalize_trip(self.trip_details)
+        # The prompt version is hashed from a planner for the normalized trip, so that
+        # spelling/whitespace variants share an entry but any prompt or tool change invalidates it
+        template_planner = TravelPlanner(TripDetails(**normalized_trip))
+        prompt_version = hashlib.sha256(json.dumps(
+            {
+                "messages": template_planner.get_message(),
+                "tools": template_planner.get_tools(),
+                "prefetch_weather": self.prefetch_weather,
+                "sectioned": self.sectioned,
+                "prompt_version": self.PROMPT_VERSION,
+            },
+            sort_keys=True
+        ).encode("utf-8")).hexdigest()
+        return plan_cache.make_key(normalized_trip, prompt_version)
+
+    def _is_cacheable(self, plan: str) -> bool:
+        return bool(plan.strip()) and plan not in (self.NO_RESPONSE_MESSAGE, self.NO_PLAN_MESSAGE)
+
+    def get_cached_plan(self):
+        """Return the cache key and the cached plan (or None); the key is None when caching is off."""
+        if not self.use_cache:
+            return None, None
+
+        cache_key = self.get_cache_key()
+        cached_plan = plan_cache.get(cache_key)
+        if cached_plan is not None:
+            logger.info(f"Serving cached travel plan (hit rate {plan_cache.hit_rate():.0%})")
+        return cache_key, cached_plan
+
+    def store_plan(self, cache_key, plan: str) -> None:
+        if cache_key is not None and self._is_cacheable(plan):
+            plan_cache.set(cache_key, plan)
+
     def generate_travel_plan(self):
-        get_messages = cast(list, self.get_message())
-        get_tools = self.get_tools()
-        model_choice = getattr(self.trip_details, 'model', 'openai').lower()
+        cache_key, cached_plan = self.get_cached_plan()
+        if cached_plan is not None:
+            return cached_plan
+
+        with llm_router.plan(self.get_model_choice()) as backend:
+            self.routed_model = backend.model_choice
+            plan = self._generate_travel_plan()
+        plan = self.artifacts.splice(plan) + self.artifacts.unreferenced()
+        self.store_plan(cache_key, plan)
+        return plan
+
+    def _generate_travel_plan(self):
+        if self.sectioned:
+            return "".join(self._stream_sectioned_plan()) or self.NO_PLAN_MESSAGE
+
+        model_choice = self.get_model_choice()
 
         # Step 1: Prepare tool-aware prompt
-        if model_choice == 'llama2':
-            tools_text = "\n\nTOOLS AVAILABLE:\n" + json.dumps(get_tools, indent=2)
-            get_messages[0]["content"] += tools_text
-            get_messages[0]["content"] += (
-                "\n\nIf you need to use a tool, respond ONLY with JSON in the format:\n"
-                '{"tool": "<tool_name>", "arguments": { ... }}\n'
-                "Otherwise, respond with your final travel plan in Markdown."
+        with span("prompt_build", model_choice):
+            self.start_weather_prefetch()
+            get_messages = cast(list, self.get_message())
+            get_tools = self.get_tools()
+            self.add_weather_context(get_messages)
+
+        # Step 2: First model call
+        with span("first_llm_call", model_choice):
+            message = llm_router.complete(
+                model_choice, lambda backend: self.prepare_round(backend, get_messages, get_tools, True)
             )
+        if message is None:
+            return self.NO_RESPONSE_MESSAGE
 
-        updated_response = None  # This will hold tool execution results
+        get_messages.append(self.assistant_message(message))
+        updated_response = self.handle_tool(message)
+        if not updated_response:
+            return self._ensure_text(message.content) if message.content else self.NO_PLAN_MESSAGE
 
-        # Step 2: First model call
-        if model_choice == 'gpt-4o-mini':
-            response = OpenAIModel.initialize_client().chat.completions.create(
-                model="gpt-4o-mini",
-                messages=get_messages,
-                tools=get_tools,
-                max_tokens=2000,
-                temperature=0.7
+        # Step 3: Tools were called, run the second round with their results
+        get_messages.extend(updated_response)
+        with span("second_llm_call", model_choice):
+            final_message = llm_router.complete(
+                model_choice, lambda backend: self.prepare_round(backend, get_messages, get_tools, False)
             )
-            if not response.choices:
-                return "No response from the model. Please check the configuration."
-
-            message = response.choices[0].message
-
-            tool_calls_payload = None
-            if getattr(message, "tool_calls", None):
-                tool_calls_payload = []
-                for tc in message.tool_calls:
-                    tool_calls_payload.append({
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments,
-                        }
-                    })
-
-            get_messages.append({
-                "role": "assistant",
-                "content": message.content or "",
-                **({"tool_calls": tool_calls_payload} if tool_calls_payload else {})
-            })
+        if final_message is not None and final_message.content:
+            return self._ensure_text(final_message.content)
 
-            updated_response = self.handle_tool(message)
+        return self.NO_PLAN_MESSAGE
 
-        else:  # llama2
-            ollama_instance = Ollama(get_messages)
-            response = ollama_instance.initialize_client()
+    def stream_round(self, messages: list, tools: list, offer_tools: bool):
+        """Stream one model round, yielding text deltas and returning the assembled message."""
+        message = None
+        events = llm_router.stream(
+            self.get_model_choice(), lambda backend: self.prepare_round(backend, messages, tools, offer_tools)
+        )
+        for event in events:
+            if isinstance(event, str):
+                yield event
+            else:
+                message = event
+        return message
 
-            first_reply = None
-            if isinstance(response, dict):
-                # Ollama chat mode
-                if "message" in response and isinstance(response["message"], dict):
-                    first_reply = response["message"].get("content", "")
-                # Ollama generate mode (usually returns "response")
-                elif "response" in response:
-                    first_reply = response["response"]
+    def stream_travel_plan(self) -> Iterator[str]:
+        cache_key, cached_plan = self.get_cached_plan()
+        if cached_plan is not None:
+            yield cached_plan
+            return
 
-            first_reply = first_reply or ""
+        # Only a stream that runs to completion is stored; an abandoned one never reaches the end
+        started = time.perf_counter()
+        plan = ""
+        with llm_router.plan(self.get_model_choice()) as backend:
+            self.routed_model = backend.model_choice
+            for chunk in self.artifacts.splice_stream(self._stream_travel_plan()):
+                if not plan:
+                    TIME_TO_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, model=self.get_model_choice())
+                plan += chunk
+                yield chunk
+        self.store_plan(cache_key, plan)
 
-            get_messages.append({"role": "assistant", "content": first_reply})
+    def _stream_travel_plan(self) -> Iterator[str]:
+        if self.sectioned:
+            emitted = False
+            for chunk in self._stream_sectioned_plan():
+                emitted = True
+                yield chunk
+            if not emitted:
+                yield self.NO_PLAN_MESSAGE
+            return
 
-            try:
-                tool_call = json.loads(first_reply)
-                if isinstance(tool_call, dict) and "tool" in tool_call:
-                    message = type("ToolMessage", (), {
-                        "tool_calls": [
-                            type("ToolCall", (), {
-                                "function": type("Function", (), {
-                                    "name": tool_call["tool"],
-                                    "arguments": json.dumps(tool_call["arguments"])
-                                }),
-                                "id": "ollama-tool-1"
-                            })
-                        ]
-                    })
-                    updated_response = self.handle_tool(message)
-                else:
-                    return self._ensure_text(first_reply)
-            except json.JSONDecodeError:
-                return self._ensure_text(first_reply)
+        model_choice = self.get_model_choice()
 
-        # Step 3: If tool was called, run second round
+        with span("prompt_build", model_choice):
+            self.start_weather_prefetch()
+            get_messages = cast(list, self.get_message())
+            get_tools = self.get_tools()
+            self.add_weather_context(get_messages)
+
+        # Step 1: First model call, streamed while watching for tool requests
+        with span("first_llm_call", model_choice):
+            message = yield from self.stream_round(get_messages, get_tools, offer_tools=True)
+        emitted = bool(message is not None and message.content)
+
+        # Step 2: If a tool was called, stream the second round
+        updated_response = None
+        if message is not None:
+            get_messages.append(self.assistant_message(message))
+            updated_response = self.handle_tool(message)
         if updated_response:
             get_messages.extend(updated_response)
-            if model_choice == 'gpt-4o-mini':
-                travel_plan = OpenAIModel.initialize_client().chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=get_messages,
-                    max_tokens=2000,
-                    temperature=0.7
-                )
-                if travel_plan.choices and travel_plan.choices[0].message:
-                    return self._ensure_text(travel_plan.choices[0].message.content)
+            if emitted:
+                yield "\n\n"
+            with span("second_llm_call", model_choice):
+                final_message = yield from self.stream_round(get_messages, get_tools, offer_tools=False)
+            emitted = emitted or bool(final_message is not None and final_message.content)
+
+        if not emitted:
+            yield self.NO_PLAN_MESSAGE
+
+    def get_trip_days(self) -> list:
+        try:
+            start = datetime.strptime(self.trip_details.travel_from.strip(), "%Y-%m-%d").date()
+            end = datetime.strptime(self.trip_details.travel_to.strip(), "%Y-%m-%d").date()
+        except ValueError:
+            return []
+        return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+    def get_section_prompts(self) -> list:
+        """(key, instruction) for every completion of a sectioned plan, in plan order.
+
+        The itinerary is split into ranges of ITINERARY_DAYS_PER_SECTION days, so a long trip is
+        written by several completions instead of running into one completion's token limit.
+        """
+        prompts = []
+        for number, (key, heading, covers) in enumerate(self.PLAN_SECTIONS, start=1):
+            section = f"section {number}, **{heading}** ({covers}), starting with the heading `## {number}. {heading}`"
+            days = self.get_trip_days() if key == "itinerary" else []
+            if not days:
+                prompts.append((key, f"Write only {section}."))
+                continue
+            if len(days) <= self.ITINERARY_DAYS_PER_SECTION:
+                day_range = f"days 1-{len(days)} ({days[0].isoformat()} to {days[-1].isoformat()})"
+                prompts.append((key, f"Write only {section}, covering {day_range}."))
+                continue
+
+            for first in range(0, len(days), self.ITINERARY_DAYS_PER_SECTION):
+                last = min(first + self.ITINERARY_DAYS_PER_SECTION, len(days)) - 1
+                day_range = f"days {first + 1}-{last + 1} ({days[first].isoformat()} to {days[last].isoformat()})"
+                if first == 0:
+                    instruction = f"Write only {section}, covering {day_range}; later days are written separately."
+                else:
+                    instruction = (f"Continue section {number}, **{heading}**, with {day_range} only: one "
+                                   f"`### Day N` heading per day and no section heading.")
+                prompts.append((f"{key}:{first + 1}-{last + 1}", instruction))
+        return prompts
+
+    def get_section_messages(self) -> list:
+        """(key, instruction, messages) per section; all share the prompt prefix and one forecast."""
+        with span("prompt_build", self.get_model_choice()):
+            self.load_session()
+            weather = self.get_session_weather()
+            if weather is None:
+                self.start_weather_prefetch(force=True)
+            messages = cast(list, self.get_message())
+            if weather is None:
+                self.add_weather_context(messages)
             else:
-                ollama_instance = Ollama(get_messages)
-                final_response = ollama_instance.initialize_client()
-                return self._ensure_text(final_response.get("choices", [{}])[0].get("message", {}).get("content", ""))
+                self.inject_weather(messages, weather)
+        return self.split_into_sections(messages)
+
+    def split_into_sections(self, messages: list) -> list:
+        system_message, user_message = messages
+        return [
+            (key, instruction, [system_message, {
+                "role": "user",
+                "content": user_message["content"] + "\n### Your part\n" + instruction +
+                           " No introduction, closing remarks or other sections.",
+            }])
+            for key, instruction in self.get_section_prompts()
+        ]
+
+    def load_session(self) -> None:
+        self._previous_plan = plan_sessions.get(self.session_id) if self.session_id else None
+
+    def get_session_inputs(self) -> dict:
+        return {**plan_cache.normalize_trip(self.trip_details), "model": self.get_model_choice()}
+
+    def get_session_weather(self):
+        """The forecast of the session's previous plan, when the destination and dates are unchanged."""
+        previous = self._previous_plan
+        if previous is None or previous["weather"] is None:
+            return None
+        inputs = self.get_session_inputs()
+        if any(previous["inputs"][field] != inputs[field] for field in self.WEATHER_INPUTS):
+            return None
+        return previous["weather"]
+
+    def get_reusable_sections(self, sections: list) -> dict:
+        """index -> text of the sections the session's previous plan wrote from the same inputs."""
+        previous = self._previous_plan
+        if previous is None:
+            return {}
 
-        return "No travel plan generated."
+        inputs = self.get_session_inputs()
+        reusable = {}
+        for index, (key, instruction, _) in enumerate(sections):
+            entry = previous["sections"].get(key)
+            fields = self.SECTION_INPUTS[key.split(":")[0]] + ("model",)
+            if entry is not None and entry[0] == instruction and all(
+                previous["inputs"][field] == inputs[field] for field in fields
+            ):
+                reusable[index] = entry[1]
+
+        CACHE_REQUESTS.inc(len(reusable), cache="section", result="hit")
+        CACHE_REQUESTS.inc(len(sections) - len(reusable), cache="section", result="miss")
+        logger.info(f"Re-planning session {self.session_id}: reusing {len(reusable)} of {len(sections)} sections")
+        return reusable
+
+    def remember_plan(self, sections: list, texts: list) -> None:
+        if not self.session_id:
+            return
+        plan_sessions.put(self.session_id, {
+            "inputs": self.get_session_inputs(),
+            "weather": self.weather,
+            "sections": {key: (instruction, text) for (key, instruction, _), text in zip(sections, texts)},
+        })
+
+    def _stream_sectioned_plan(self) -> Iterator[str]:
+        """Stream the sections in order while later ones are already being generated.
+
+        Each section streams into its own queue; the current section is passed through live and
+        the ones after it are buffered until it is done, so the plan reads as one stream. Sections
+        the session's previous plan already wrote from the same inputs are replayed, not generated.
+        """
+        model_choice = self.get_model_choice()
+        sections = self.get_section_messages()
+        queues = [queue.Queue() for _ in sections]
+        cancelled = threading.Event()
+
+        reusable = self.get_reusable_sections(sections)
+        for index, text in reusable.items():
+            queues[index].put(text)
+            queues[index].put(None)
+
+        def run_section(index: int, key: str, messages: list) -> None:
+            events = llm_router.stream(
+                model_choice, lambda backend: self.prepare_round(backend, messages, None, False)
+            )
+            try:
+                with span(f"section:{key.split(':')[0]}", model_choice):
+                    for event in events:
+                        if cancelled.is_set():
+                            break
+                        if isinstance(event, str):
+                            queues[index].put(event)
+                queues[index].put(None)
+            except Exception as e:
+                queues[index].put(e)
+            finally:
+                events.close()
+
+        waiting = iter([(index, section) for index, section in enumerate(sections) if index not in reusable])
+        waiting_lock = threading.Lock()
+
+        def submit_next(_=None) -> None:
+            with waiting_lock:
+                item = next(waiting, None)
+            if item is not None and not cancelled.is_set():
+                index, (key, _, messages) = item
+                _section_executor.submit(run_section, index, key, messages).add_done_callback(submit_next)
+
+        for _ in range(max(1, self.SECTION_CONCURRENCY)):
+            submit_next()
+
+        texts = [""] * len(sections)
+        try:
+            for index, section_queue in enumerate(queues):
+                separated = not any(texts)
+                while True:
+                    item = section_queue.get()
+                    if item is None:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    if not separated:
+                        yield "\n\n"
+                        separated = True
+                    texts[index] += item
+                    yield item
+        finally:
+            # Stops sections still streaming when the plan fails or its consumer goes away
+            cancelled.set()
+        self.remember_plan(sections, texts)
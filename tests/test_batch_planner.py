@@ -0,0 +1,42 @@
+import asyncio
+import json
+
+from services.batch_planner import BatchPlanner
+from services.traveler_planner import TravelPlanner
+
+
+def _trip(trip_id: str, destination: str) -> str:
+    return json.dumps({"id": trip_id, "destination": destination, "travel_from": "2026-11-01",
+                       "travel_to": "2026-11-03", "travel_experience": "cultural", "spend_level": "budget"})
+
+
+def test_fallback_plans_are_errors_and_retried_on_resume(monkeypatch, tmp_path):
+    input_path = tmp_path / "trips.jsonl"
+    output_path = tmp_path / "plans.jsonl"
+    input_path.write_text(_trip("paris", "Paris") + "\n" + _trip("rome", "Rome") + "\n", encoding="utf-8")
+    answers = {"Paris": "# Paris plan", "Rome": TravelPlanner.NO_PLAN_MESSAGE}
+    planned = []
+
+    async def plan(self, trip_details):
+        planned.append(trip_details.destination)
+        return answers[trip_details.destination]
+
+    monkeypatch.setattr(BatchPlanner, "plan", plan)
+
+    stats = asyncio.run(BatchPlanner().run(str(input_path), str(output_path)))
+    records = {record["id"]: record for record in map(json.loads, output_path.read_text().splitlines())}
+
+    assert stats["planned"] == 1 and stats["failed"] == 1
+    assert records["paris"]["plan"] == "# Paris plan"
+    assert records["rome"] == {"id": "rome", "line": 2, "error": TravelPlanner.NO_PLAN_MESSAGE}
+
+    # An output file from before the fix, with the fallback written as a plan, is retried as well
+    with open(output_path, "a", encoding="utf-8") as out:
+        out.write(json.dumps({"id": "rome", "line": 2, "plan": TravelPlanner.NO_RESPONSE_MESSAGE}) + "\n")
+    answers["Rome"] = "# Rome plan"
+    planned.clear()
+
+    stats = asyncio.run(BatchPlanner().run(str(input_path), str(output_path)))
+
+    assert planned == ["Rome"]
+    assert stats["planned"] == 1 and stats["skipped"] == 1
@@ -0,0 +1,58 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from benchmarks.fake_servers import _FakeHandler
+from services.scheduler import scheduler
+from tools.city_index import city_index
+from tools.forecast_cache import ForecastCache
+
+
+class _RateLimitedOWM(BaseHTTPRequestHandler):
+    """Answers the first forecast request with OWM's 429 and every later one with a forecast."""
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        if len(self.requests) == 1:
+            status, payload = 429, {"cod": 429, "message": "Your account is temporarily blocked"}
+        else:
+            status, payload = 200, _FakeHandler._forecast(None, "Paris", "metric")
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def owm_server(monkeypatch, tmp_path):
+    _RateLimitedOWM.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RateLimitedOWM)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    # pyowm is pointed at the fake server the way the benchmarks do it
+    monkeypatch.setenv("OWM_PROXY", f"http://{host}:{port}")
+    monkeypatch.setenv("OWM_USE_SSL", "false")
+    monkeypatch.setenv("OPEN_WEATHER_API_KEY", "test-key")
+    monkeypatch.setattr(city_index, "path", str(tmp_path / "cities.sqlite3"))
+    provider = scheduler.get_provider("owm")
+    monkeypatch.setattr(provider, "backoff_base", 0.01)
+    monkeypatch.setattr(provider, "requests", None)
+    yield _RateLimitedOWM.requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_sync_forecast_retries_owm_rate_limit(owm_server):
+    forecast = ForecastCache(ttl_seconds=60, max_entries=8).get_forecast("Paris")
+
+    assert len(owm_server) == 2
+    assert sum(len(slots) for slots in forecast.values()) == 40
@@ -0,0 +1,64 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from models.backend import ChatBackend
+from models.ollama import Ollama
+from services.llm_router import LLMRouter
+
+
+class _StalledOllama(BaseHTTPRequestHandler):
+    """Starts a streamed chat reply and then sends nothing until the client hangs up."""
+    protocol_version = "HTTP/1.1"
+    disconnected = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        self.connection.settimeout(10)
+        try:
+            self.connection.recv(1)  # returns once the client has closed its side
+        except OSError:
+            return
+        self.disconnected.set()
+
+
+class _Fast(ChatBackend):
+    name = "fast"
+    model_choice = "fast"
+
+    @classmethod
+    def stream(cls, messages, tools=None, cancellation=None):
+        yield "fast"
+        yield cls.message("fast")
+
+
+@pytest.fixture
+def stalled_ollama(monkeypatch):
+    _StalledOllama.disconnected = threading.Event()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StalledOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    monkeypatch.setattr(Ollama, "CHAT_API", f"http://{host}:{port}/api/chat")
+    yield _StalledOllama.disconnected
+    server.shutdown()
+    server.server_close()
+
+
+def test_hedged_complete_cuts_off_the_losing_request(stalled_ollama):
+    router = LLMRouter([Ollama, _Fast], hedge=True, default_deadline=0.1)
+
+    message = router.complete("llama2", lambda backend: ([{"role": "user", "content": "Plan"}], None))
+
+    assert message.content == "fast"
+    # Without the cancellation the stalled read would only end at the server's 10s timeout
+    assert stalled_ollama.wait(2)
+    assert router.loads["ollama"].error_rate == 0
@@ -0,0 +1,32 @@
+import time
+
+import httpx
+import pytest
+
+from services.scheduler import OutboundScheduler, Provider
+
+
+def test_call_stops_retrying_at_its_timeout():
+    scheduler = OutboundScheduler({"flaky": Provider("flaky", max_retries=4, backoff_base=5.0, backoff_max=5.0)})
+
+    def request():
+        raise httpx.ConnectError("connection refused")
+
+    started = time.monotonic()
+    with pytest.raises(httpx.ConnectError):
+        scheduler.call("flaky", request, timeout=1.0)
+
+    assert time.monotonic() - started < 1.0
+
+
+def test_call_does_not_wait_for_a_rate_limit_past_its_timeout():
+    scheduler = OutboundScheduler({"limited": Provider("limited", requests_per_minute=1)})
+    scheduler.call("limited", lambda: None)
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        scheduler.call("limited", lambda: None, timeout=1.0)
+
+    assert time.monotonic() - started < 1.0
+    # The call that gave up took nothing from the budget
+    assert scheduler.get_provider("limited").requests.peek() == pytest.approx(60, abs=1)
@@ -0,0 +1,298 @@
+import difflib
+import gzip
+import json
+import logging
+import math
+import os
+import sqlite3
+import string
+import threading
+import unicodedata
+from typing import NamedTuple, Optional
+
+from config import load_config
+from services.metrics import CACHE_REQUESTS
+
+load_config()
+
+logger = logging.getLogger(__name__)
+
+
+class Location(NamedTuple):
+    owm_id: int
+    name: str
+    country: str
+    lat: float
+    lon: float
+
+    @property
+    def key(self) -> str:
+        """Cache key shared by every spelling that resolves to this location."""
+        return f"owm:{self.owm_id}"
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}, {self.country}" if self.country else self.name
+
+
+# Major destinations and the spellings travellers use for them, so common lookups resolve
+# before OWM's full city list is imported: (OWM id, name, country, lat, lon, aliases)
+SEED_CITIES = (
+    (5128581, "New York", "US", 40.7143, -74.006, ("nyc", "new york city", "manhattan", "big apple")),
+    (5368361, "Los Angeles", "US", 34.0522, -118.2437, ("la",)),
+    (5391959, "San Francisco", "US", 37.7749, -122.4194, ("sf", "san fran")),
+    (4887398, "Chicago", "US", 41.85, -87.65, ()),
+    (4164138, "Miami", "US", 25.7743, -80.1937, ()),
+    (5506956, "Las Vegas", "US", 36.175, -115.1372, ("vegas",)),
+    (4140963, "Washington", "US", 38.8951, -77.0364, ("washington dc", "washington d c", "dc")),
+    (5856195, "Honolulu", "US", 21.3069, -157.8583, ()),
+    (6167865, "Toronto", "CA", 43.7001, -79.4163, ()),
+    (6173331, "Vancouver", "CA", 49.2497, -123.1193, ()),
+    (6077243, "Montreal", "CA", 45.5088, -73.5878, ()),
+    (3530597, "Mexico City", "MX", 19.4285, -99.1277, ("ciudad de mexico", "cdmx")),
+    (3451190, "Rio de Janeiro", "BR", -22.9028, -43.2075, ("rio",)),
+    (3435910, "Buenos Aires", "AR", -34.6132, -58.3772, ()),
+    (2643743, "London", "GB", 51.5085, -0.1257, ()),
+    (2650225, "Edinburgh", "GB", 55.9521, -3.1965, ()),
+    (2964574, "Dublin", "IE", 53.344, -6.2672, ()),
+    (2988507, "Paris", "FR", 48.8534, 2.3488, ()),
+    (2950159, "Berlin", "DE", 52.5244, 13.4105, ()),
+    (2867714, "Munich", "DE", 48.1374, 11.5755, ("munchen",)),
+    (2759794, "Amsterdam", "NL", 52.374, 4.8897, ()),
+    (2800866, "Brussels", "BE", 50.8505, 4.3488, ("bruxelles", "brussel")),
+    (2657896, "Zurich", "CH", 47.3667, 8.55, ()),
+    (2761369, "Vienna", "AT", 48.2085, 16.3721, ("wien",)),
+    (3067696, "Prague", "CZ", 50.088, 14.4208, ("praha",)),
+    (3054643, "Budapest", "HU", 47.498, 19.0399, ()),
+    (3094802, "Krakow", "PL", 50.0614, 19.9366, ("cracow",)),
+    (3117735, "Madrid", "ES", 40.4165, -3.7026, ()),
+    (3128760, "Barcelona", "ES", 41.3888, 2.159, ()),
+    (2267057, "Lisbon", "PT", 38.7167, -9.1333, ("lisboa",)),
+    (3169070, "Rome", "IT", 41.8947, 12.4839, ("roma",)),
+    (3176959, "Florence", "IT", 43.7792, 11.2463, ("firenze",)),
+    (3164603, "Venice", "IT", 45.4386, 12.3267, ("venezia",)),
+    (264371, "Athens", "GR", 37.9838, 23.7278, ("athina",)),
+    (2618425, "Copenhagen", "DK", 55.6759, 12.5655, ("kobenhavn",)),
+    (2673730, "Stockholm", "SE", 59.3326, 18.0649, ()),
+    (3143244, "Oslo", "NO", 59.9127, 10.7461, ()),
+    (3413829, "Reykjavik", "IS", 64.1355, -21.8954, ()),
+    (745044, "Istanbul", "TR", 41.0138, 28.9497, ()),
+    (524901, "Moscow", "RU", 55.7522, 37.6156, ("moskva",)),
+    (498817, "Saint Petersburg", "RU", 59.9386, 30.3141, ("st petersburg",)),
+    (360630, "Cairo", "EG", 30.0626, 31.2497, ()),
+    (2542997, "Marrakesh", "MA", 31.6315, -8.0083, ("marrakech",)),
+    (3369157, "Cape Town", "ZA", -33.9258, 18.4232, ()),
+    (292223, "Dubai", "AE", 25.0772, 55.3093, ()),
+    (1275339, "Mumbai", "IN", 19.0144, 72.8479, ("bombay",)),
+    (1273294, "Delhi", "IN", 28.6519, 77.2315, ("new delhi",)),
+    (1609350, "Bangkok", "TH", 13.754, 100.5014, ()),
+    (1880252, "Singapore", "SG", 1.2897, 103.8501, ()),
+    (1735161, "Kuala Lumpur", "MY", 3.1412, 101.6865, ("kl",)),
+    (1819729, "Hong Kong", "HK", 22.2855, 114.1577, ("hk",)),
+    (1816670, "Beijing", "CN", 39.9075, 116.3972, ("peking",)),
+    (1796236, "Shanghai", "CN", 31.2222, 121.4581, ()),
+    (1835848, "Seoul", "KR", 37.566, 126.9784, ()),
+    (1850147, "Tokyo", "JP", 35.6895, 139.6917, ()),
+    (1857910, "Kyoto", "JP", 35.0211, 135.7538, ()),
+    (1853909, "Osaka", "JP", 34.6937, 135.5022, ()),
+    (2147714, "Sydney", "AU", -33.8679, 151.2073, ()),
+    (2158177, "Melbourne", "AU", -37.814, 144.9633, ()),
+)
+SEED_RANK = 1  # preferred over imported cities of the same name ("Paris" is Paris, FR, not Paris, TX)
+
+_PUNCTUATION = str.maketrans({character: " " for character in string.punctuation})
+
+
+class CityIndex:
+    """Canonical locations for free-text destinations, so every spelling of a city shares one forecast.
+
+    Cities (OWM id, name, country, coordinates) and their aliases are stored in SQLite and held in
+    memory once loaded. Lookups are normalized (case, accents, punctuation) and fall back to fuzzy
+    matching for typos. The index starts with SEED_CITIES; OWM's full city list can be imported,
+    and every city OpenWeatherMap resolves by name is learned under the spelling that was asked for.
+    """
+
+    def __init__(self, path: str, fuzzy_cutoff: float, fuzzy_max_candidates: int):
+        self.path = path
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.fuzzy_max_candidates = fuzzy_max_candidates
+        self._lock = threading.Lock()
+        self._connection = None
+        self._cities = None  # owm id -> (Location, rank)
+        self._aliases = {}  # normalized alias -> [owm id, ...]
+        self._by_shape = {}  # (first two letters, length) -> aliases, the candidates for fuzzy matching
+
+    @staticmethod
+    def normalize_name(text: str) -> str:
+        decomposed = unicodedata.normalize("NFKD", text)
+        stripped = "".join(character for character in decomposed if not unicodedata.combining(character))
+        return " ".join(stripped.casefold().translate(_PUNCTUATION).split())
+
+    def resolve(self, text: str) -> Optional[Location]:
+        """The location `text` names ("NYC", "new york city", "Paris, FR"), or None if unknown."""
+        query = self.normalize_name(text)
+        if not query:
+            return None
+
+        name, country = query, None
+        if "," in text:
+            # "City, CC" narrows the lookup to a country. Any other suffix ("London, Ontario") may
+            # name a different city than the bare name, so unless the whole text is a known alias
+            # it is left to OpenWeatherMap's name lookup, which the index then learns from
+            head, tail = text.rsplit(",", 1)
+            tail = self.normalize_name(tail)
+            name = self.normalize_name(head) or query
+            country = tail.upper() if len(tail) == 2 else None
+
+        with self._lock:
+            self._ensure_loaded()
+            location = self._pick(query, None)
+            result = "exact"
+            if location is None and (country or "," not in text):
+                location = self._pick(name, country)
+                if location is None:
+                    location = self._pick_fuzzy(name, country)
+                    result = "fuzzy"
+            if location is None:
+                result = "miss"
+
+        CACHE_REQUESTS.inc(cache="city", result=result)
+        if location is not None and result == "fuzzy":
+            logger.info(f"Resolved {text!r} to {location.label} by fuzzy match")
+        return location
+
+    def learn(self, text: str, owm_id: int, name: str, country: str, lat: float, lon: float) -> Location:
+        """Record a city OpenWeatherMap resolved from `text`, so the next lookup is local."""
+        location = Location(int(owm_id), name, country or "", float(lat), float(lon))
+        with self._lock:
+            self._ensure_loaded()
+            self._add([(location, 0)], [(self.normalize_name(text), location.owm_id),
+                                        (self.normalize_name(name), location.owm_id)])
+        return location
+
+    def import_owm_city_list(self, path: str) -> int:
+        """Load OWM's bulk city list (city.list.json, optionally gzipped); returns the cities read."""
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            cities = json.load(f)
+
+        rows = []
+        aliases = []
+        for city in cities:
+            location = Location(int(city["id"]), city["name"], city.get("country") or "",
+                                float(city["coord"]["lat"]), float(city["coord"]["lon"]))
+            rows.append((location, 0))
+            aliases.append((self.normalize_name(location.name), location.owm_id))
+        with self._lock:
+            self._ensure_loaded()
+            self._add(rows, aliases)
+        logger.info(f"Imported {len(rows)} cities into {self.path}")
+        return len(rows)
+
+    def _pick(self, alias: str, country: Optional[str]) -> Optional[Location]:
+        candidates = [self._cities[owm_id] for owm_id in self._aliases.get(alias, ())]
+        if country:
+            candidates = [candidate for candidate in candidates if candidate[0].country == country]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda candidate: candidate[1])[0]
+
+    def _pick_fuzzy(self, name: str, country: Optional[str]) -> Optional[Location]:
+        if len(name) < 4:
+            return None  # too short to tell a typo from a different city
+        # Only aliases with the same first two letters and a length that allows a similarity of
+        # fuzzy_cutoff are compared, which keeps a lookup to a few ms with OWM's full city list
+        shortest = math.ceil(len(name) * self.fuzzy_cutoff / (2 - self.fuzzy_cutoff))
+        longest = math.floor(len(name) * (2 - self.fuzzy_cutoff) / self.fuzzy_cutoff)
+        candidates = []
+        for length in range(shortest, longest + 1):
+            candidates.extend(self._by_shape.get((name[:2], length), ()))
+        if len(candidates) > self.fuzzy_max_candidates:
+            logger.debug(f"Skipping fuzzy match for {name!r}: {len(candidates)} candidates")
+            return None
+        matches = difflib.get_close_matches(name, candidates, n=3, cutoff=self.fuzzy_cutoff)
+        for alias in matches:
+            location = self._pick(alias, country)
+            if location is not None:
+                return location
+        return None
+
+    def _add(self, rows: list, aliases: list) -> None:
+        """Store cities (Location, rank) and (alias, owm id) pairs; existing cities keep their rank."""
+        connection = self._get_connection()
+        with connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO cities (owm_id, name, country, lat, lon, rank) VALUES (?, ?, ?, ?, ?, ?)",
+                [(*location, rank) for location, rank in rows]
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO aliases (alias, owm_id) VALUES (?, ?)",
+                [(alias, owm_id) for alias, owm_id in aliases if alias]
+            )
+        for location, rank in rows:
+            self._cities.setdefault(location.owm_id, (location, rank))
+        for alias, owm_id in aliases:
+            self._remember_alias(alias, owm_id)
+
+    def _remember_alias(self, alias: str, owm_id: int) -> None:
+        if not alias:
+            return
+        owm_ids = self._aliases.setdefault(alias, [])
+        if owm_id not in owm_ids:
+            if not owm_ids:
+                self._by_shape.setdefault((alias[:2], len(alias)), []).append(alias)
+            owm_ids.append(owm_id)
+
+    def _ensure_loaded(self) -> None:
+        # Callers hold self._lock
+        if self._cities is not None:
+            return
+        connection = self._get_connection()
+        if connection.execute("SELECT COUNT(*) FROM cities").fetchone()[0] == 0:
+            self._seed(connection)
+
+        self._cities = {}
+        for owm_id, name, country, lat, lon, rank in connection.execute(
+            "SELECT owm_id, name, country, lat, lon, rank FROM cities"
+        ):
+            self._cities[owm_id] = (Location(owm_id, name, country, lat, lon), rank)
+        for alias, owm_id in connection.execute("SELECT alias, owm_id FROM aliases"):
+            self._remember_alias(alias, owm_id)
+        logger.info(f"City index loaded: {len(self._cities)} cities, {len(self._aliases)} names")
+
+    def _seed(self, connection: sqlite3.Connection) -> None:
+        with connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO cities (owm_id, name, country, lat, lon, rank) VALUES (?, ?, ?, ?, ?, ?)",
+                [(owm_id, name, country, lat, lon, SEED_RANK) for owm_id, name, country, lat, lon, _ in SEED_CITIES]
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO aliases (alias, owm_id) VALUES (?, ?)",
+                [(self.normalize_name(alias), owm_id)
+                 for owm_id, name, _, _, _, aliases in SEED_CITIES for alias in (name, *aliases)]
+            )
+
+    def _get_connection(self) -> sqlite3.Connection:
+        # Callers hold self._lock, so a single connection can be shared between threads
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS cities (owm_id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+                    "country TEXT NOT NULL, lat REAL NOT NULL, lon REAL NOT NULL, rank INTEGER NOT NULL)"
+                )
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS aliases (alias TEXT NOT NULL, owm_id INTEGER NOT NULL, "
+                    "PRIMARY KEY (alias, owm_id))"
+                )
+        return self._connection
+
+
+city_index = CityIndex(
+    path=os.getenv("CITY_INDEX_PATH", os.path.join(".cache", "cities.sqlite3")),
+    fuzzy_cutoff=float(os.getenv("CITY_FUZZY_CUTOFF", "0.85")),
+    fuzzy_max_candidates=int(os.getenv("CITY_FUZZY_MAX_CANDIDATES", "1000"))
+)
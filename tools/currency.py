@@ -1,11 +1,10 @@
-import datetime
-import os
-from dotenv import load_dotenv
-from python_exchange_rates import AbstractExchangeRates
+import logging
 
 from schemas.currency import CurrencyConversion
+from tools.exchange_rates import exchange_rate_table
+
+logger = logging.getLogger(__name__)
 
-load_dotenv(override=True)
 
 class CurrencyConverterTool:
     data: CurrencyConversion
@@ -17,7 +16,7 @@ class CurrencyConverterTool:
     def get_tool_description() -> dict:
         return {
             "name": "convert_currency",
-            "description": "Convert an amount from one currency to another. Call this tool to convert a specified amount from one currency to another.",
+            "description": "Convert an amount from one currency to another. Call this tool to convert a specified amount from one currency to another. Pass 'amounts' to convert several amounts (e.g. every line of a budget) in one call.",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -35,6 +34,11 @@ class CurrencyConverterTool:
                             "amount": {
                                 "type": "number",
                                 "description": "The amount of money to convert."
+                            },
+                            "amounts": {
+                                "type": "array",
+                                "items": {"type": "number"},
+                                "description": "Optional list of amounts to convert with the same currency pair."
                             }
                         },
                         "required": ["from_currency", "to_currency", "amount"],
@@ -47,30 +51,37 @@ class CurrencyConverterTool:
         }
 
     def convert_currency(self) -> dict:
-        print("Calling convert_currency tool...")
-        print("Fetching currency conversion information...")
-        api_key = os.getenv("ABSTRACT_API_KEY")
+        logger.info("Calling convert_currency tool...")
+        amounts = self.get_amounts()
+        return self._build_result(exchange_rate_table.convert_many(amounts, self.data.get('from_currency'), self.data.get('to_currency')))
+
+    async def aconvert_currency(self) -> dict:
+        logger.info("Calling convert_currency tool (async)...")
+        amounts = self.get_amounts()
+        return self._build_result(await exchange_rate_table.aconvert_many(amounts, self.data.get('from_currency'), self.data.get('to_currency')))
 
-        if not api_key:
-            raise ValueError("ABSTRACT_API_KEY environment variable is not set. Please set it in your .env file.")
-        elif api_key.strip() != api_key:
-            raise ValueError("ABSTRACT_API_KEY must not contain leading or trailing whitespace. Please check your API key.")
-        else:
-            print("Abstract API key is valid and loaded successfully.")
+    def get_amounts(self) -> list:
+        return self.data.get('amounts') or [self.data.get('amount')]
 
+    def _build_result(self, converted: list) -> dict:
         base = self.data.get('from_currency')
         target = self.data.get('to_currency')
         amount = self.data.get('amount')
-        date = datetime.datetime.now().strftime("%Y-%m-%d")
+        amounts = self.data.get('amounts')
 
-        conversion_result = AbstractExchangeRates.convert(base, target, date, amount)
+        if amounts:
+            logger.info(f"Converted {len(amounts)} amounts from {base} to {target}.")
+            return {
+                "from_currency": base,
+                "to_currency": target,
+                "amounts": amounts,
+                "converted_amounts": converted,
+            }
 
-        if conversion_result is None:
-            raise ValueError(f"Conversion from {base} to {target} failed. Please check the currency codes and try again.")
-        print(f"Converted {amount} {base} to {conversion_result['result']} {target} on {date}.")
+        logger.info(f"Converted {amount} {base} to {converted[0]} {target}.")
         return {
             "from_currency": base,
             "to_currency": target,
             "amount": amount,
-            "converted_amount": conversion_result['result'],
-        }
\ No newline at end of file
+            "converted_amount": converted[0],
+        }
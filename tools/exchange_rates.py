@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+import httpx
+import requests
+
+from config import load_config
+from services.scheduler import scheduler
+
+load_config()
+
+logger = logging.getLogger(__name__)
+
+
+class ExchangeRateTable:
+    """All rates for one base currency, fetched once per day; any pair is derived locally."""
+    LIVE_API = "https://exchange-rates.abstractapi.com/v1/live/"
+
+    def __init__(self, base: str, timeout: float = 10.0):
+        self.base = base.upper()
+        # Bounds a fetch with all its retries; the planner gives convert_currency as long
+        self.timeout = timeout
+        self._rates = None
+        self._rates_day = None
+        self._lock = threading.Lock()
+        self._async_fetch = None
+        self._async_client = None
+
+    @staticmethod
+    def get_api_key() -> str:
+        api_key = os.getenv("ABSTRACT_API_KEY")
+        if not api_key:
+            raise ValueError("ABSTRACT_API_KEY environment variable is not set. Please set it in your .env file.")
+        elif api_key.strip() != api_key:
+            raise ValueError("ABSTRACT_API_KEY must not contain leading or trailing whitespace. Please check your API key.")
+        return api_key
+
+    def get_rates(self) -> dict:
+        today = datetime.now(timezone.utc).date()
+        with self._lock:
+            if self._rates is None or self._rates_day != today:
+                self._rates = self._fetch()
+                self._rates_day = today
+            return self._rates
+
+    async def aget_rates(self) -> dict:
+        today = datetime.now(timezone.utc).date()
+        if self._rates is not None and self._rates_day == today:
+            return self._rates
+
+        if self._async_fetch is None:
+            self._async_fetch = asyncio.ensure_future(self._afetch(today))
+            self._async_fetch.add_done_callback(lambda _: setattr(self, "_async_fetch", None))
+        return await asyncio.shield(self._async_fetch)
+
+    def get_rate(self, from_currency: str, to_currency: str) -> float:
+        return self.cross_rate(self.get_rates(), from_currency, to_currency)
+
+    @staticmethod
+    def cross_rate(rates: dict, from_currency: str, to_currency: str) -> float:
+        from_currency, to_currency = from_currency.upper(), to_currency.upper()
+        for code in (from_currency, to_currency):
+            if code not in rates:
+                raise ValueError(f"Unsupported currency code: {code}. Please check the currency codes and try again.")
+        # Cross rate through the table's base: 1 FROM = (1 / base->FROM) * base->TO
+        return rates[to_currency] / rates[from_currency]
+
+    def convert(self, amount: float, from_currency: str, to_currency: str) -> float:
+        return self.convert_many([amount], from_currency, to_currency)[0]
+
+    def convert_many(self, amounts: list, from_currency: str, to_currency: str) -> list:
+        rate = self.get_rate(from_currency, to_currency)
+        return [round(amount * rate, 2) for amount in amounts]
+
+    async def aconvert_many(self, amounts: list, from_currency: str, to_currency: str) -> list:
+        rate = self.cross_rate(await self.aget_rates(), from_currency, to_currency)
+        return [round(amount * rate, 2) for amount in amounts]
+
+    def _fetch(self) -> dict:
+        logger.info(f"Fetching daily exchange rates for base {self.base}...")
+        def request() -> requests.Response:
+            response = requests.get(
+                self.LIVE_API,
+                params={"api_key": self.get_api_key(), "base": self.base},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response
+
+        try:
+            data = scheduler.call("exchange_rates", request, timeout=self.timeout).json()
+        except requests.RequestException as e:
+            raise RuntimeError(f"Failed to fetch exchange rates: {e}")
+        return self._parse_rates(data)
+
+    async def _afetch(self, today) -> dict:
+        logger.info(f"Fetching daily exchange rates for base {self.base} (async)...")
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(timeout=self.timeout)
+        async def request() -> httpx.Response:
+            response = await self._async_client.get(
+                self.LIVE_API,
+                params={"api_key": self.get_api_key(), "base": self.base}
+            )
+            response.raise_for_status()
+            return response
+
+        try:
+            response = await scheduler.acall("exchange_rates", request)
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Failed to fetch exchange rates: {e}")
+
+        rates = self._parse_rates(response.json())
+        with self._lock:
+            self._rates = rates
+            self._rates_day = today
+        return rates
+
+    def _parse_rates(self, data: dict) -> dict:
+        rates = {code.upper(): float(rate) for code, rate in data.get("exchange_rates", {}).items()}
+        if not rates:
+            raise ValueError(f"No exchange rates returned for base {self.base}.")
+        rates[self.base] = 1.0
+        return rates
+
+
+exchange_rate_table = ExchangeRateTable(
+    os.getenv("EXCHANGE_RATE_BASE", "USD"),
+    timeout=float(os.getenv("CURRENCY_TOOL_TIMEOUT", "10"))
+)
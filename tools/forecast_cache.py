@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+
+import httpx
+
+from config import load_config
+from services.metrics import CACHE_REQUESTS
+from services.scheduler import scheduler
+from tools.city_index import city_index
+
+load_config()
+
+logger = logging.getLogger(__name__)
+
+
+class ForecastCache:
+    """Process-wide 5-day/3-hour forecasts, fetched once per location and indexed by date.
+
+    Destinations are resolved through the city index, so "NYC" and "New York City" share one
+    entry and are fetched by coordinates. Names the index does not know are fetched by name, and
+    the city OpenWeatherMap matched is learned for the next lookup.
+    """
+    OWM_API_URL = os.getenv("OWM_API_URL", "https://api.openweathermap.org/data/2.5").rstrip("/")
+
+    def __init__(self, ttl_seconds: float, max_entries: int, timeout: float = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Bounds a synchronous fetch with all its retries; the planner gives get_weather as long
+        self.timeout = timeout
+        self._entries = OrderedDict()  # location key -> (expires_at, {date: [slot, ...]})
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self._async_fetches = {}
+        self._weather_manager = None
+        self._async_client = None
+
+    @staticmethod
+    def normalize_location(city: str) -> str:
+        return " ".join(city.split()).casefold()
+
+    @staticmethod
+    def get_api_key() -> str:
+        api_key = os.getenv("OPEN_WEATHER_API_KEY")
+        if not api_key:
+            raise ValueError("OPEN_WEATHER_API_KEY environment variable is not set. Please set it in your .env file.")
+        elif api_key.strip() != api_key:
+            raise ValueError("OPEN_WEATHER_API_KEY must not contain leading or trailing whitespace. Please check your API key.")
+        return api_key
+
+    def get_weather_manager(self):
+        if self._weather_manager is None:
+            with self._lock:
+                if self._weather_manager is None:
+                    # pyowm is only needed by the synchronous pipeline, so it is imported on first use
+                    from pyowm import OWM
+
+                    self._weather_manager = OWM(self.get_api_key(), self.get_owm_config()).weather_manager()
+        return self._weather_manager
+
+    @staticmethod
+    def get_owm_config() -> dict:
+        from pyowm.utils.config import get_default_config
+
+        config = get_default_config()
+        # pyowm has no base-URL setting, so an HTTP proxy is how its requests are redirected
+        # (a corporate proxy, or the local stand-in server used by the benchmarks)
+        proxy = os.getenv("OWM_PROXY")
+        if proxy:
+            config['connection']['use_proxy'] = True
+            config['proxies'] = {'http': proxy, 'https': proxy}
+        config['connection']['use_ssl'] = os.getenv("OWM_USE_SSL", "true").lower() in ("1", "true", "yes")
+        return config
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=5.0))
+        return self._async_client
+
+    def get_location_key(self, city: str) -> tuple:
+        """(cache key, resolved Location or None) for a free-text destination."""
+        location = city_index.resolve(city)
+        if location is not None:
+            return location.key, location
+        return self.normalize_location(city), None
+
+    def get_forecast(self, city: str) -> dict:
+        key, location = self.get_location_key(city)
+
+        index = self._lookup(key)
+        if index is not None:
+            CACHE_REQUESTS.inc(cache="forecast", result="hit")
+            return index
+        CACHE_REQUESTS.inc(cache="forecast", result="miss")
+
+        # Only one thread fetches a given location; the others wait and then read the cached result
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+        with fetch_lock:
+            index = self._lookup(key)
+            if index is None:
+                index = self._fetch(city, location)
+                self._store(key, index)
+        with self._lock:
+            self._fetch_locks.pop(key, None)
+        return index
+
+    def get_slots(self, city: str, day: date) -> list:
+        return self.get_forecast(city).get(day, [])
+
+    async def aget_forecast(self, city: str) -> dict:
+        # Resolving may load the index from SQLite or fuzzy-match, so it stays off the event loop
+        key, location = await asyncio.to_thread(self.get_location_key, city)
+
+        index = self._lookup(key)
+        if index is not None:
+            CACHE_REQUESTS.inc(cache="forecast", result="hit")
+            return index
+        CACHE_REQUESTS.inc(cache="forecast", result="miss")
+
+        # Concurrent coroutines asking for the same location await one shared fetch
+        pending = self._async_fetches.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._afetch(key, city, location))
+            self._async_fetches[key] = pending
+            pending.add_done_callback(lambda _: self._async_fetches.pop(key, None))
+        # Shielded so that one cancelled caller does not cancel the fetch for everyone else
+        return await asyncio.shield(pending)
+
+    async def aget_slots(self, city: str, day: date) -> list:
+        return (await self.aget_forecast(city)).get(day, [])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, index = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return index
+
+    def _store(self, key: str, index: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def _afetch(self, key: str, city: str, location) -> dict:
+        logger.info(f"Fetching 5-day forecast for {location.label if location else city} from OpenWeatherMap (async)...")
+        if location is not None:
+            params = {"lat": location.lat, "lon": location.lon}
+        else:
+            params = {"q": city}
+
+        async def request() -> httpx.Response:
+            response = await self.get_async_client().get(
+                f"{self.OWM_API_URL}/forecast",
+                params={**params, "appid": self.get_api_key(), "units": "metric"}
+            )
+            response.raise_for_status()
+            return response
+
+        try:
+            # Concurrent lookups of one city are already coalesced by aget_forecast
+            response = await scheduler.acall("owm", request)
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Failed to fetch forecast for {city}: {e}")
+
+        payload = response.json()
+        index = {}
+        for item in payload.get("list", []):
+            reference_time = datetime.fromtimestamp(item["dt"], tz=timezone.utc)
+            index.setdefault(reference_time.date(), []).append({
+                "time": reference_time.isoformat(),
+                "temperature": item["main"]["temp"],
+                "status": item["weather"][0]["main"] if item.get("weather") else "",
+                "humidity": item["main"]["humidity"],
+                "wind_speed": item.get("wind", {}).get("speed"),
+            })
+        self._store(key, index)
+        resolved = payload.get("city")
+        if location is None and resolved and resolved.get("id") and resolved.get("coord"):
+            # Learn the city OWM matched and file the forecast under it, so other spellings that
+            # resolve to it locally from now on find it cached
+            learned = await asyncio.to_thread(
+                city_index.learn, city, resolved["id"], resolved["name"], resolved.get("country"),
+                resolved["coord"]["lat"], resolved["coord"]["lon"]
+            )
+            self._store(learned.key, index)
+        return index
+
+    def _fetch(self, city: str, location) -> dict:
+        logger.info(f"Fetching 5-day forecast for {location.label if location else city} from OpenWeatherMap...")
+        if location is not None:
+            forecast = scheduler.call(
+                "owm", lambda: self.get_weather_manager().forecast_at_coords(location.lat, location.lon, '3h'),
+                timeout=self.timeout
+            )
+        else:
+            forecast = scheduler.call(
+                "owm", lambda: self.get_weather_manager().forecast_at_place(city, '3h'), timeout=self.timeout
+            )
+
+        index = {}
+        for weather in forecast.forecast.weathers:
+            reference_time = weather.reference_time('date')
+            index.setdefault(reference_time.date(), []).append({
+                "time": reference_time.isoformat(),
+                "temperature": weather.temperature('celsius')['temp'],
+                "status": weather.status,
+                "humidity": weather.humidity,
+                "wind_speed": weather.wind()['speed'],
+            })
+        if location is None and forecast.forecast.location is not None and forecast.forecast.location.id:
+            resolved = forecast.forecast.location
+            learned = city_index.learn(city, resolved.id, resolved.name, resolved.country, resolved.lat, resolved.lon)
+            self._store(learned.key, index)
+        return index
+
+
+forecast_cache = ForecastCache(
+    ttl_seconds=float(os.getenv("FORECAST_CACHE_TTL", "1800")),
+    max_entries=int(os.getenv("FORECAST_CACHE_SIZE", "512")),
+    timeout=float(os.getenv("WEATHER_TOOL_TIMEOUT", "15"))
+)
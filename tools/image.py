@@ -1,16 +1,29 @@
+import asyncio
 import base64
+import logging
+import os
+from datetime import datetime
 from io import BytesIO
-from PIL import Image
-from PIL.ImageFile import ImageFile
+from typing import TYPE_CHECKING
 
 from models.open_ai import OpenAIModel
 from tools import weather
+from tools.city_index import city_index
+from tools.image_cache import image_cache
+
+if TYPE_CHECKING:
+    from PIL.ImageFile import ImageFile
+
+logger = logging.getLogger(__name__)
 
 
 class ImageGenerator:
     destination_city: str
     trip_dates: str
 
+    # Bounds a synchronous generation with all its retries; the planner gives generate_image as long
+    TIMEOUT = float(os.getenv("IMAGE_TOOL_TIMEOUT", "90"))
+
     def __init__(self, destination_city: str, trip_dates: str):
         self.destination_city = destination_city
         self.trip_dates = trip_dates
@@ -38,10 +51,21 @@ class ImageGenerator:
             }
         }
 
-    def generate_image(self) -> ImageFile:
-        weather_tool = weather.WeatherTool(self.destination_city, self.trip_dates)
-        weather_data = weather_tool.get_weather()
+    def get_travel_from(self) -> str:
+        # trip_dates may be a range ("2023-10-01 - 2023-10-10"); the first date drives weather and season
+        return self.trip_dates.strip()[:10]
+
+    def get_cache_key(self, weather_data: dict) -> str:
+        # Keyed by the canonical location, so every spelling of a city reuses the same images
+        location = city_index.resolve(self.destination_city)
+        return image_cache.make_key(
+            location.key if location else self.destination_city,
+            datetime.strptime(self.get_travel_from(), "%Y-%m-%d").month,
+            weather_data
+        )
 
+    @staticmethod
+    def build_prompt(weather_data: dict) -> str:
         if "message" in weather_data:
             weather_desc = "typical seasonal weather"
         else:
@@ -51,24 +75,68 @@ class ImageGenerator:
                 f"wind speed {weather_data['wind_speed']} m/s"
             )
 
-        prompt = (
+        return (
             f"Generate a realistic image of {weather_data['city']} on {weather_data['travel_from']} "
             f"showing {weather_desc}. "
             f"Make sure the scenery reflects the weather and time of year, "
             f"with iconic landmarks and natural seasonal colors."
         )
 
-        response = OpenAIModel.initialize_client().images.generate(
-            model="dall-e-3",
-            prompt=prompt,
-            n=1,
-            size="512x512",  # Reduced size for UI rendering and lower token usage
-            response_format="b64_json",
-        )
+    @staticmethod
+    def get_request(prompt: str) -> dict:
+        return {
+            "model": "dall-e-3",
+            "prompt": prompt,
+            "n": 1,
+            "size": "512x512",  # Reduced size for UI rendering and lower token usage
+            "response_format": "b64_json",
+        }
 
+    @staticmethod
+    def decode_response(response) -> bytes:
         if not response.data:
             raise ValueError("No image data returned from OpenAI API.")
+        # Keep the encoded PNG as returned; callers that need pixels decode it themselves
+        return base64.b64decode(response.data[0].b64_json)
+
+    def generate_image_bytes(self) -> bytes:
+        weather_tool = weather.WeatherTool(self.destination_city, self.get_travel_from())
+        weather_data = weather_tool.get_weather()
+
+        cache_key = self.get_cache_key(weather_data)
+        cached_image = image_cache.get(cache_key)
+        if cached_image is not None:
+            logger.info(f"Serving cached image for {self.destination_city}")
+            return cached_image
+
+        # Concurrent requests for the same image share one generation
+        response = OpenAIModel.generate_image(
+            self.get_request(self.build_prompt(weather_data)), key=f"image:{cache_key}", timeout=self.TIMEOUT
+        )
+        image_data = self.decode_response(response)
+        image_cache.put(cache_key, image_data)
+        return image_data
+
+    async def agenerate_image_bytes(self) -> bytes:
+        weather_tool = weather.WeatherTool(self.destination_city, self.get_travel_from())
+        weather_data = await weather_tool.aget_weather()
+
+        # The city index and the image cache are read from disk, away from the event loop
+        cache_key = await asyncio.to_thread(self.get_cache_key, weather_data)
+        cached_image = await asyncio.to_thread(image_cache.get, cache_key)
+        if cached_image is not None:
+            logger.info(f"Serving cached image for {self.destination_city}")
+            return cached_image
+
+        response = await OpenAIModel.agenerate_image(
+            self.get_request(self.build_prompt(weather_data)), key=f"image:{cache_key}"
+        )
+        image_data = self.decode_response(response)
+        await asyncio.to_thread(image_cache.put, cache_key, image_data)
+        return image_data
+
+    def generate_image(self) -> "ImageFile":
+        # Pillow is only needed when a caller wants pixels, not for the PNG bytes the planner embeds
+        from PIL import Image
 
-        image_base64 = response.data[0].b64_json
-        image_data = base64.b64decode(image_base64)
-        return Image.open(BytesIO(image_data))
\ No newline at end of file
+        return Image.open(BytesIO(self.generate_image_bytes()))
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import threading
+from typing import Optional
+
+from config import load_config
+from services.metrics import CACHE_REQUESTS
+
+load_config()
+
+
+class ImageCache:
+    """Content-addressed PNG bytes on disk, evicted least-recently-used once over a size budget."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def temperature_bucket(temperature: float) -> str:
+        if temperature < 5:
+            return "freezing"
+        if temperature < 15:
+            return "cold"
+        if temperature < 25:
+            return "mild"
+        return "hot"
+
+    @classmethod
+    def make_key(cls, city: str, month: int, weather: dict) -> str:
+        # Bucket the inputs so near-identical requests ("Tokyo, rainy, October") share one image
+        if "status" in weather:
+            weather_bucket = f"{weather['status'].casefold()}-{cls.temperature_bucket(weather['temperature'])}"
+        else:
+            weather_bucket = "seasonal"
+        normalized = "|".join((" ".join(city.split()).casefold(), f"{month:02d}", weather_bucket))
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            CACHE_REQUESTS.inc(cache="image", result="miss")
+            return None
+        CACHE_REQUESTS.inc(cache="image", result="hit")
+        # The modification time doubles as the LRU clock
+        os.utime(path)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".png"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+image_cache = ImageCache(
+    directory=os.getenv("IMAGE_CACHE_DIR", os.path.join(".cache", "images")),
+    max_bytes=int(os.getenv("IMAGE_CACHE_MAX_MB", "200")) * 1024 * 1024
+)
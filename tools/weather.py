@@ -1,24 +1,29 @@
-import os
-from datetime import datetime
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from statistics import fmean
 
-from dotenv import load_dotenv
-from pyowm import OWM
+from tools.forecast_cache import forecast_cache
 
-load_dotenv(override=True)
+logger = logging.getLogger(__name__)
 
 class WeatherTool:
     destination_city: str
     travel_from: str  # format 'YYYY-MM-DD'
+    travel_to: str    # optional, format 'YYYY-MM-DD'; switches to a per-day table for the whole trip
 
-    def __init__(self, destination_city: str, travel_from: str):
+    RANGE_COLUMNS = ["date", "temp_min", "temp_max", "temp_mean", "humidity", "wind_speed", "status"]
+
+    def __init__(self, destination_city: str, travel_from: str, travel_to: str = None):
         self.destination_city = destination_city
         self.travel_from = travel_from
+        self.travel_to = travel_to
 
     @staticmethod
     def get_tool_description() -> dict:
         return {
             "name": "get_weather",
-            "description": "Get the current weather for a specified city over a defined period. Call this tool to get weather information for a specific city.",
+            "description": "Get the weather forecast for a city. Pass travel_to as well to get one per-day table for the whole trip in a single call.",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -30,6 +35,11 @@ class WeatherTool:
                         "type": "string",
                         "description": "Departure date of the trip in 'YYYY-MM-DD' format",
                         "example": "2023-10-01"
+                    },
+                    "travel_to": {
+                        "type": "string",
+                        "description": "Optional last day of the trip in 'YYYY-MM-DD' format",
+                        "example": "2023-10-05"
                     }
                 },
                 "required": ["destination_city", "travel_from"],
@@ -38,46 +48,85 @@ class WeatherTool:
         }
 
     def get_weather(self) -> dict:
-        print("Calling get_weather tool...")
-        print("Fetching weather information...")
-        api_key = os.getenv("OPEN_WEATHER_API_KEY")
+        logger.info("Calling get_weather tool...")
+        logger.info("Fetching weather information...")
 
-        if not api_key:
-            raise ValueError("OPEN_WEATHER_API_KEY environment variable is not set. Please set it in your .env file.")
-        elif api_key.strip() != api_key:
-            raise ValueError("OPEN_WEATHER_API_KEY must not contain leading or trailing whitespace. Please check your API key.")
-        else:
-            print("API key is valid, proceeding with weather fetch...")
+        if self.travel_to:
+            return self._build_range(forecast_cache.get_forecast(self.destination_city))
+        trip_date = datetime.strptime(self.travel_from, "%Y-%m-%d")
+        slots = forecast_cache.get_slots(self.destination_city, trip_date.date())
+        return self._build_weather(slots)
 
-        owm = OWM(api_key)
-        mgr = owm.weather_manager()
+    async def aget_weather(self) -> dict:
+        logger.info("Calling get_weather tool (async)...")
 
+        if self.travel_to:
+            return self._build_range(await forecast_cache.aget_forecast(self.destination_city))
         trip_date = datetime.strptime(self.travel_from, "%Y-%m-%d")
-        forecast = mgr.forecast_at_place(self.destination_city, '3h')
-        weather_on_trip = None
-        for weather in forecast.forecast.weathers:
-            if weather.reference_time('date').date() == trip_date.date():
-                weather_on_trip = weather
-                break
+        slots = await forecast_cache.aget_slots(self.destination_city, trip_date.date())
+        return self._build_weather(slots)
+
+    def _build_weather(self, slots: list) -> dict:
+        weather_on_trip = slots[0] if slots else None
 
         if weather_on_trip:
-            print(f"Weather on {self.travel_from} in {self.destination_city}: {weather_on_trip.status}, "
-                  f"Temperature: {weather_on_trip.temperature('celsius')['temp']}°C, "
-                  f"Humidity: {weather_on_trip.humidity}%, Wind Speed: {weather_on_trip.wind()['speed']} m/s")
+            logger.info(f"Weather on {self.travel_from} in {self.destination_city}: {weather_on_trip['status']}, "
+                  f"Temperature: {weather_on_trip['temperature']}°C, "
+                  f"Humidity: {weather_on_trip['humidity']}%, Wind Speed: {weather_on_trip['wind_speed']} m/s")
             return {
                 "city": self.destination_city,
-                "temperature": weather_on_trip.temperature('celsius')['temp'],
-                "status": weather_on_trip.status,
-                "humidity": weather_on_trip.humidity,
-                "wind_speed": weather_on_trip.wind()['speed'],
+                "temperature": weather_on_trip['temperature'],
+                "status": weather_on_trip['status'],
+                "humidity": weather_on_trip['humidity'],
+                "wind_speed": weather_on_trip['wind_speed'],
                 "travel_from": self.travel_from
             }
         else:
-            print(f"No weather forecast available for {self.destination_city} on {self.travel_from}.")
+            logger.warning(f"No weather forecast available for {self.destination_city} on {self.travel_from}.")
             return {
                 "city": self.destination_city,
                 "message": "No forecast available for the specified trip date.",
                 "travel_from": self.travel_from
             }
 
+    def _build_range(self, forecast: dict) -> dict:
+        """Aggregate the 3-hour slots of every trip day into one compact row per day."""
+        start = datetime.strptime(self.travel_from, "%Y-%m-%d").date()
+        end = datetime.strptime(self.travel_to, "%Y-%m-%d").date()
+        if end < start:
+            raise ValueError(f"travel_to ({self.travel_to}) is before travel_from ({self.travel_from})")
 
+        rows = []
+        missing = []
+        day = start
+        while day <= end:
+            slots = forecast.get(day)
+            if slots:
+                temperatures = [slot["temperature"] for slot in slots]
+                rows.append([
+                    day.isoformat(),
+                    round(min(temperatures), 1),
+                    round(max(temperatures), 1),
+                    round(fmean(temperatures), 1),
+                    round(fmean(slot["humidity"] for slot in slots)),
+                    round(fmean(slot["wind_speed"] or 0 for slot in slots), 1),
+                    Counter(slot["status"] for slot in slots).most_common(1)[0][0],
+                ])
+            else:
+                missing.append(day.isoformat())
+            day += timedelta(days=1)
+
+        logger.info(f"Weather for {self.destination_city} {self.travel_from}..{self.travel_to}: "
+                    f"{len(rows)} forecast days, {len(missing)} without forecast")
+        weather = {
+            "city": self.destination_city,
+            "travel_from": self.travel_from,
+            "travel_to": self.travel_to,
+            "units": "celsius, %, m/s",
+            "columns": self.RANGE_COLUMNS,
+            "days": rows,
+        }
+        if missing:
+            # The forecast only reaches five days ahead; later days need seasonal norms
+            weather["no_forecast"] = f"{missing[0]} to {missing[-1]}" if len(missing) > 1 else missing[0]
+        return weather